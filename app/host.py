@@ -92,12 +92,108 @@ def stop_mining():
     return make_response(message, status)
 
 
+@app.route('/mining-report', methods=[GET])
+def get_mining_report():
+    message, status = node.get_mining_report()
+    return make_response(message, status)
+
+
+@app.route('/miner-metrics', methods=[GET])
+def get_miner_metrics():
+    message, status = node.get_miner_metrics()
+    return make_response(message, status)
+
+
+@app.route('/mempool', methods=[GET])
+def get_mempool_stats():
+    message, status = node.get_mempool_stats()
+    return make_response(message, status)
+
+
+@app.route('/verifying-key-cache', methods=[GET])
+def get_verifying_key_cache_stats():
+    message, status = node.get_verifying_key_cache_stats()
+    return make_response(message, status)
+
+
+@app.route('/signature-verifier', methods=[GET])
+def get_signature_verifier_stats():
+    message, status = node.get_signature_verifier_stats()
+    return make_response(message, status)
+
+
+@app.route('/peer-stats', methods=[GET])
+def get_peer_stats():
+    message, status = node.get_peer_stats()
+    return make_response(message, status)
+
+
+@app.route('/inv', methods=[POST])
+def inv():
+    message, status = node.handle_inv(request.json)
+    return make_response(message, status)
+
+
+@app.route('/getdata', methods=[POST])
+def getdata():
+    message, status = node.get_data(request.json)
+    return make_response(message, status)
+
+
+@app.route('/keys', methods=[POST])
+def get_keys():
+    message, status = node.get_keys(request.json)
+    return make_response(message, status)
+
+
+@app.route('/gossip-stats', methods=[GET])
+def get_gossip_stats():
+    message, status = node.get_gossip_stats()
+    return make_response(message, status)
+
+
+@app.route('/orphan-pool', methods=[GET])
+def get_orphan_pool_stats():
+    message, status = node.get_orphan_pool_stats()
+    return make_response(message, status)
+
+
+@app.route('/reorg-stats', methods=[GET])
+def get_reorg_stats():
+    message, status = node.get_reorg_stats()
+    return make_response(message, status)
+
+
+@app.route('/headers', methods=[POST])
+def get_headers():
+    message, status = node.get_headers(request.json)
+    return make_response(message, status)
+
+
+@app.route('/sync', methods=[POST])
+def start_sync():
+    message, status = node.start_sync()
+    return make_response(message, status)
+
+
+@app.route('/sync-status', methods=[GET])
+def get_sync_status():
+    message, status = node.get_sync_status()
+    return make_response(message, status)
+
+
 @app.route('/current-balance/<id>', methods=[GET])
 def get_current_balance(id):
     message, status = node.get_current_balance(id)
     return make_response(message, status)
 
 
+@app.route('/transaction/<id>', methods=[GET])
+def get_transaction(id):
+    message, status = node.get_transaction(id)
+    return make_response(message, status)
+
+
 @app.route('/get-block-count', methods=[GET])
 def get_block_count():
     message, status = node.get_block_count()
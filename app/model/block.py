@@ -1,13 +1,77 @@
 from hashlib import sha256
+from model.transaction import Transaction
+import struct
+
+# hash of str(dict) over header and all transactions - genesis and blocks created before merkle header
+BLOCK_VERSION_LEGACY = 1
+# hash of fixed size header with merkle root of transactions
+BLOCK_VERSION_MERKLE = 2
+BLOCK_VERSION = BLOCK_VERSION_MERKLE
+# version, previous block hash, merkle root, timestamp, bits
+HEADER_PREFIX = struct.Struct('>I32s32sII')
+# nonce is the last field of the header, so it can be hashed after a precomputed prefix
+HEADER_NONCE = struct.Struct('>I')
+EMPTY_HASH = '00' * 32
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
 
 class Block:
-    def __init__(self, previous_block_hash, nonce, transactions, previous_block):
-        # first part of block which contains important information 
-        self.__header = self.Header(previous_block_hash, nonce)
+    __slots__ = ('__header', '__data', '__previous_block', '__hash')
+
+    """
+    Create block object from dict (static method)
+    """
+    def from_dict_to_block(dict, previous_block=None, block_hash=None):
+        header = dict['header']
+        return Block(
+            header['previous_block_hash'],
+            header['nonce'],
+            [Transaction.from_dict_to_transaction(t) for t in dict['data']],
+            previous_block,
+            block_hash=block_hash,
+            version=header.get('version', BLOCK_VERSION_LEGACY),
+            # received merkle root is never calculated from transactions, a missing one is malformed
+            merkle_root=header.get('merkle_root', ''),
+            timestamp=header.get('timestamp'),
+            bits=header.get('bits')
+        )
+
+    """
+    Calculate merkle root over hashes of signed transactions (static method),
+    odd node on each level is paired with itself
+    """
+    def calculate_merkle_root(transactions):
+        level = [sha256(t.get_serialized(True)).digest() for t in transactions]
+        if not level:
+            return EMPTY_HASH
+        while len(level) > 1:
+            if len(level) % 2 == 1:
+                level.append(level[-1])
+            level = [sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+        return level[0].hex()
+
+    def __init__(
+        self,
+        previous_block_hash,
+        nonce,
+        transactions,
+        previous_block,
+        block_hash=None,
+        data_loader=None,
+        version=BLOCK_VERSION_LEGACY,
+        merkle_root=None,
+        timestamp=None,
+        bits=None
+    ):
+        if version == BLOCK_VERSION_MERKLE and merkle_root is None:
+            merkle_root = Block.calculate_merkle_root(transactions)
+        # first part of block which contains important information
+        self.__header = self.Header(previous_block_hash, nonce, version, merkle_root, timestamp, bits)
         # second part of block which contains transactions
-        self.__data = self.Data(transactions)
+        self.__data = self.Data(transactions, data_loader)
         # reference to previous block
         self.__previous_block = previous_block
+        # header and data are not modified after creation, hash is calculated once
+        self.__hash = block_hash
 
     def set_previous_block(self, block):
         self.__previous_block = block
@@ -35,17 +99,38 @@ class Block:
 
     """
     Calculate and return sha256
-    bases on cast dictionary to str
+    legacy blocks hash cast dictionary to str,
+    newer ones only the fixed size header
     """
     def get_hash(self):
-        data = str(self.to_dict())
-        return sha256(data.encode('utf-8')).hexdigest()
+        if self.__hash is None:
+            if self.__header.get_version() == BLOCK_VERSION_LEGACY:
+                # equal to str(self.to_dict()), transactions reuse their cached str
+                data = f"{{'header': {self.__header.to_dict()!r}, 'data': {self.__data.get_legacy_str()}}}"
+                self.__hash = sha256(data.encode('utf-8')).hexdigest()
+            else:
+                self.__hash = sha256(self.__header.pack()).hexdigest()
+        return self.__hash
+
+    """
+    Return True if merkle root in header matches block transactions
+    """
+    def has_valid_merkle_root(self):
+        if self.__header.get_version() == BLOCK_VERSION_LEGACY:
+            return True
+        return self.__header.get_merkle_root() == Block.calculate_merkle_root(self.__data.get_transactions())
 
 
     class Header:
-        def __init__(self, previous_block_hash, nonce):
+        __slots__ = ('__previous_block_hash', '__nonce', '__version', '__merkle_root', '__timestamp', '__bits')
+
+        def __init__(self, previous_block_hash, nonce, version=BLOCK_VERSION_LEGACY, merkle_root=None, timestamp=None, bits=None):
             self.__previous_block_hash = previous_block_hash
             self.__nonce = nonce
+            self.__version = version
+            self.__merkle_root = merkle_root
+            self.__timestamp = timestamp
+            self.__bits = bits
 
         def get_previous_block_hash(self):
             return self.__previous_block_hash
@@ -53,37 +138,94 @@ class Block:
         def get_nonce(self):
             return self.__nonce
 
-        def set_previous_block_hash(self, previous_block_hash):
-            self.__previous_block_hash = previous_block_hash
+        def get_version(self):
+            return self.__version
 
-        def set_nonce(self, nonce):
-            self.__nonce = nonce
+        def get_merkle_root(self):
+            return self.__merkle_root
+
+        def get_timestamp(self):
+            return self.__timestamp
+
+        def get_bits(self):
+            return self.__bits
+
+        """
+        Return True if fields of newer header can be packed,
+        legacy headers are hashed as str and have no fixed layout
+        """
+        def is_well_formed(self):
+            if self.__version == BLOCK_VERSION_LEGACY:
+                return True
+            if self.__version != BLOCK_VERSION_MERKLE:
+                return False
+            for value in (self.__previous_block_hash, self.__merkle_root):
+                if not isinstance(value, str) or len(value) != 64 or not all(c in HEX_DIGITS for c in value):
+                    return False
+            for value in (self.__nonce, self.__timestamp, self.__bits):
+                if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < 2 ** 32:
+                    return False
+            return True
+
+        """
+        Return binary header without nonce
+        """
+        def pack_prefix(self):
+            return HEADER_PREFIX.pack(
+                self.__version,
+                bytes.fromhex(self.__previous_block_hash or EMPTY_HASH),
+                bytes.fromhex(self.__merkle_root),
+                self.__timestamp,
+                self.__bits
+            )
+
+        """
+        Return fixed size binary header
+        """
+        def pack(self):
+            return self.pack_prefix() + HEADER_NONCE.pack(self.__nonce)
 
         """
         Return header as a dictionary
         """
         def to_dict(self, key_as_hex=False):
             header = {}
+            if self.__version != BLOCK_VERSION_LEGACY:
+                header['version'] = self.__version
             header['previous_block_hash'] = self.__previous_block_hash
+            if self.__version != BLOCK_VERSION_LEGACY:
+                header['merkle_root'] = self.__merkle_root
+                header['timestamp'] = self.__timestamp
+                header['bits'] = self.__bits
             if not key_as_hex:
                 header['nonce'] = self.__nonce
             return header
 
     class Data:
-        def __init__(self, transactions):
-            self.__transactions = transactions
+        __slots__ = ('__transactions', '__loader')
 
-        def set_transactions(self, transactions):
+        def __init__(self, transactions, loader=None):
             self.__transactions = transactions
+            # transactions of stored blocks may be paged in on demand
+            self.__loader = loader
 
         def get_transactions(self):
+            if self.__transactions is None:
+                return self.__loader()
             return self.__transactions
 
-        def add_transaction(self, transaction):
-            self.__transactions.append(transaction)
-
-        def clear_transactions(self):
-            self.__transactions = []
+        """
+        Drop resident transactions, next access loads them with given loader
+        """
+        def page_out(self, loader):
+            self.__loader = loader
+            self.__transactions = None
 
         def to_dict(self, key_as_hex=False):
-            return [t.to_dict(True, key_as_hex) for t in self.__transactions]
+            return [t.to_dict(True, key_as_hex) for t in self.get_transactions()]
+
+        """
+        Return str of transactions list with signatures
+        """
+        def get_legacy_str(self):
+            return '[' + ', '.join(t.get_legacy_str(True) for t in self.get_transactions()) + ']'
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+from model.transaction import Transaction
+import json
+
+class BlockBodyCache:
+    """
+    Bounded LRU cache of block transactions decoded from the block log
+    Used when only block headers are kept in memory
+    """
+    def __init__(self, block_log, capacity):
+        self.__block_log = block_log
+        self.__capacity = capacity
+        self.__lock = Lock()
+        self.__bodies = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    """
+    Return loader which pages in transactions of given block
+    """
+    def get_loader(self, block_hash):
+        return partial(self.get_transactions, block_hash)
+
+    def get_transactions(self, block_hash):
+        with self.__lock:
+            transactions = self.__bodies.get(block_hash)
+            if transactions is not None:
+                self.__bodies.move_to_end(block_hash)
+                self.__hits += 1
+                return transactions
+            self.__misses += 1
+        payload = self.__block_log.read(block_hash)
+        if payload is None:
+            raise Exception(f"Block {block_hash} not found in block log")
+        transactions = [Transaction.from_dict_to_transaction(t) for t in json.loads(payload)['data']]
+        with self.__lock:
+            self.__bodies[block_hash] = transactions
+            while len(self.__bodies) > self.__capacity:
+                self.__bodies.popitem(last=False)
+        return transactions
+
+    def get_stats(self):
+        return {
+            'size': len(self.__bodies),
+            'capacity': self.__capacity,
+            'hits': self.__hits,
+            'misses': self.__misses
+        }
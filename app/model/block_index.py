@@ -0,0 +1,60 @@
+class BlockIndex:
+    """
+    Index of blocks connected to the blockchain keyed by block hash,
+    every entry knows its parent, height and cumulative work
+    """
+    def __init__(self):
+        self.__entries = {}
+
+    """
+    Add block to the index as a child of its previous block,
+    block without known parent is added as a root (height 0)
+    """
+    def add(self, block, work):
+        block_hash = block.get_hash()
+        entry = self.__entries.get(block_hash)
+        if entry is not None:
+            return entry
+        parent = self.__entries.get(block.get_header().get_previous_block_hash())
+        entry = self.Entry(block, block_hash, parent, work)
+        self.__entries[block_hash] = entry
+        return entry
+
+    def get(self, block_hash):
+        return self.__entries.get(block_hash)
+
+    def contains(self, block_hash):
+        return block_hash in self.__entries
+
+    def get_height(self, block_hash):
+        entry = self.__entries.get(block_hash)
+        return entry.get_height() if entry is not None else None
+
+    def __len__(self):
+        return len(self.__entries)
+
+    """
+    The Entry class represents one indexed block
+    """
+    class Entry:
+        def __init__(self, block, block_hash, parent, work):
+            self.__block = block
+            self.__hash = block_hash
+            self.__parent = parent
+            self.__height = parent.get_height() + 1 if parent is not None else 0
+            self.__chain_work = parent.get_chain_work() + work if parent is not None else work
+
+        def get_block(self):
+            return self.__block
+
+        def get_hash(self):
+            return self.__hash
+
+        def get_parent(self):
+            return self.__parent
+
+        def get_height(self):
+            return self.__height
+
+        def get_chain_work(self):
+            return self.__chain_work
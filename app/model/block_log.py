@@ -0,0 +1,202 @@
+from threading import RLock
+from time import time
+import mmap
+import os
+import struct
+import zlib
+
+BLOCK_LOG_FILENAME = 'blocks.dat'
+BLOCK_LOG_INDEX_FILENAME = 'blocks.idx'
+RECORD_MAGIC = b'SCB1'
+# magic, payload length, crc32 of payload, block hash
+RECORD_HEADER = struct.Struct('>4sII32s')
+# block hash, record offset
+INDEX_ENTRY = struct.Struct('>32sQ')
+FSYNC_BATCH = 32
+FSYNC_INTERVAL = 1.0
+
+class BlockLog:
+    """
+    Append-only file of length-prefixed, checksummed block records
+    with a side index of block hash -> record offset
+    """
+    def __init__(self, files_path, log):
+        self.__log = log
+        self.__lock = RLock()
+        self.__path = f"{files_path}/{BLOCK_LOG_FILENAME}"
+        self.__index_path = f"{files_path}/{BLOCK_LOG_INDEX_FILENAME}"
+        self.__offsets = {}
+        self.__order = []
+        self.__unsynced = 0
+        self.__last_sync = time()
+        self.__recover()
+        # unbuffered - every record reaches the OS in one write, fsync is batched
+        self.__file = open(self.__path, 'ab', buffering=0)
+        self.__index_file = open(self.__index_path, 'ab', buffering=0)
+        # read-only memory map of the log, remapped when the log grows
+        self.__read_file = open(self.__path, 'rb')
+        self.__map = None
+
+    """
+    Load side index and scan records which are not indexed yet,
+    torn or corrupted tail of the log is truncated
+    """
+    def __recover(self):
+        open(self.__path, 'ab').close()
+        log_size = os.path.getsize(self.__path)
+        offset = self.__load_index(log_size)
+        recovered = []
+        with open(self.__path, 'rb') as file:
+            file.seek(offset)
+            while offset < log_size:
+                record = self.__read_record(file, offset)
+                if record is None:
+                    self.__log.error(f"Torn block record at offset {offset}, truncating block log")
+                    break
+                block_hash, payload = record
+                recovered.append((block_hash, offset))
+                offset += RECORD_HEADER.size + len(payload)
+        if offset < log_size:
+            with open(self.__path, 'r+b') as file:
+                file.truncate(offset)
+                os.fsync(file.fileno())
+        if recovered:
+            self.__log.info(f"Recovered {len(recovered)} block record(s) missing in block log index")
+            with open(self.__index_path, 'ab') as index_file:
+                for block_hash, record_offset in recovered:
+                    self.__add_offset(block_hash, record_offset)
+                    index_file.write(INDEX_ENTRY.pack(block_hash, record_offset))
+
+    """
+    Read side index, entries pointing outside of the log are dropped
+    Return offset of the first record which is not indexed
+    """
+    def __load_index(self, log_size):
+        open(self.__index_path, 'ab').close()
+        with open(self.__index_path, 'rb') as index_file:
+            data = index_file.read()
+        valid_size = 0
+        end = 0
+        with open(self.__path, 'rb') as file:
+            for position in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size):
+                block_hash, offset = INDEX_ENTRY.unpack_from(data, position)
+                if offset + RECORD_HEADER.size > log_size:
+                    break
+                file.seek(offset)
+                magic, length, _, record_hash = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+                if magic != RECORD_MAGIC or record_hash != block_hash or \
+                        offset + RECORD_HEADER.size + length > log_size:
+                    break
+                self.__add_offset(block_hash, offset)
+                valid_size = position + INDEX_ENTRY.size
+                end = max(end, offset + RECORD_HEADER.size + length)
+        if valid_size != len(data):
+            with open(self.__index_path, 'r+b') as index_file:
+                index_file.truncate(valid_size)
+        return end
+
+    def __read_record(self, file, offset):
+        file.seek(offset)
+        header = file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        magic, length, checksum, block_hash = RECORD_HEADER.unpack(header)
+        if magic != RECORD_MAGIC:
+            return None
+        payload = file.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return None
+        return block_hash, payload
+
+    def __add_offset(self, block_hash, offset):
+        if block_hash not in self.__offsets:
+            self.__order.append(block_hash)
+        self.__offsets[block_hash] = offset
+
+    """
+    Append block payload to the log, fsync is batched
+    """
+    def append(self, block_hash, payload):
+        raw_hash = bytes.fromhex(block_hash)
+        with self.__lock:
+            if raw_hash in self.__offsets:
+                return self.__offsets[raw_hash]
+            offset = self.__file.tell()
+            self.__file.write(
+                RECORD_HEADER.pack(RECORD_MAGIC, len(payload), zlib.crc32(payload), raw_hash) + payload
+            )
+            self.__index_file.write(INDEX_ENTRY.pack(raw_hash, offset))
+            self.__add_offset(raw_hash, offset)
+            self.__unsynced += 1
+            if self.__unsynced >= FSYNC_BATCH or time() - self.__last_sync >= FSYNC_INTERVAL:
+                self.sync()
+            return offset
+
+    """
+    Flush pending records to disk, log first and index after
+    """
+    def sync(self):
+        with self.__lock:
+            os.fsync(self.__file.fileno())
+            os.fsync(self.__index_file.fileno())
+            self.__unsynced = 0
+            self.__last_sync = time()
+
+    def close(self):
+        with self.__lock:
+            if self.__file.closed:
+                return
+            self.sync()
+            self.__file.close()
+            self.__index_file.close()
+            if self.__map is not None:
+                self.__map.close()
+            self.__read_file.close()
+
+    def contains(self, block_hash):
+        return bytes.fromhex(block_hash) in self.__offsets
+
+    def get_offset(self, block_hash):
+        return self.__offsets.get(bytes.fromhex(block_hash))
+
+    """
+    Return payload of the block with given hash,
+    record is read from the memory mapped log
+    """
+    def read(self, block_hash):
+        offset = self.get_offset(block_hash)
+        if offset is None:
+            return None
+        with self.__lock:
+            if self.__map is None or len(self.__map) < offset + RECORD_HEADER.size:
+                self.__remap()
+            magic, length, checksum, _ = RECORD_HEADER.unpack_from(self.__map, offset)
+            start = offset + RECORD_HEADER.size
+            if len(self.__map) < start + length:
+                self.__remap()
+            payload = self.__map[start:start + length]
+        if magic != RECORD_MAGIC or zlib.crc32(payload) != checksum:
+            self.__log.error(f"Block record {block_hash} is corrupted")
+            return None
+        return payload
+
+    def __remap(self):
+        if self.__map is not None:
+            self.__map.close()
+        self.__map = mmap.mmap(self.__read_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    """
+    Iterate (block hash, payload) of all records in the order they were appended
+    """
+    def read_all(self):
+        with self.__lock:
+            order = list(self.__order)
+            offsets = dict(self.__offsets)
+        with open(self.__path, 'rb') as file:
+            for raw_hash in order:
+                record = self.__read_record(file, offsets[raw_hash])
+                if record is not None:
+                    yield raw_hash.hex(), record[1]
+
+    def __len__(self):
+        return len(self.__offsets)
@@ -0,0 +1,62 @@
+from time import time
+from model.block import Block, BLOCK_VERSION
+from model.header_midstate import HeaderMidstate
+
+class BlockTemplate:
+    """
+    Mining template of a candidate block
+    Merkle root of transactions and the header up to the nonce are hashed once,
+    so every proof-of-work attempt only hashes the nonce bytes
+    """
+    def __init__(self, previous_block_hash, transactions, previous_block, bits):
+        self.__previous_block_hash = previous_block_hash
+        self.__transactions = transactions
+        self.__previous_block = previous_block
+        self.__bits = bits
+        self.__timestamp = int(time())
+        self.__merkle_root = Block.calculate_merkle_root(transactions)
+        header = Block.Header(
+            previous_block_hash,
+            0,
+            BLOCK_VERSION,
+            self.__merkle_root,
+            self.__timestamp,
+            bits
+        )
+        # nonce is the last field of the header
+        self.__header_prefix = header.pack_prefix()
+        self.__midstate = HeaderMidstate(self.__header_prefix)
+
+    def get_previous_block_hash(self):
+        return self.__previous_block_hash
+
+    def get_transactions(self):
+        return self.__transactions
+
+    """
+    Return binary header without nonce, enough for workers to search the nonce
+    """
+    def get_header_prefix(self):
+        return self.__header_prefix
+
+    """
+    Return hash of the block with given nonce as an integer,
+    identical to int(Block.get_hash(), 16)
+    """
+    def hash_nonce(self, nonce):
+        return self.__midstate.hash_nonce(nonce)
+
+    """
+    Create block object for found nonce
+    """
+    def to_block(self, nonce):
+        return Block(
+            self.__previous_block_hash,
+            nonce,
+            self.__transactions,
+            self.__previous_block,
+            version=BLOCK_VERSION,
+            merkle_root=self.__merkle_root,
+            timestamp=self.__timestamp,
+            bits=self.__bits
+        )
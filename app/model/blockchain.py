@@ -2,106 +2,223 @@ from hashlib import sha256
 from time import time
 from model.genesis_data import GENESIS_DATA
 from model.transaction import Transaction
-from model.block import Block
+from model.block import Block, BLOCK_VERSION_LEGACY
+from model.block_index import BlockIndex
+from model.block_log import BlockLog
+from model.block_body_cache import BlockBodyCache
+from model.utxo_set import UtxoSet
+from model.transaction_index import TransactionIndex
+from model.orphan_pool import OrphanPool
+from model.reorg_engine import ReorgEngine
+from model.utxo_snapshot import UtxoSnapshot
+from model.key_registry import KeyRegistry
+from threading import Thread
+import atexit
 import json
 
 
-BLOCKCHAIN_FILENAME = 'blockchain.txt'
 SHA_SIZE = 256
+# number of decoded blocks kept in memory when block bodies are loaded lazily
+BLOCK_CACHE_SIZE = 256
+# migration window - legacy blocks (hash over whole block) are accepted up to this height
+LEGACY_BLOCK_MAX_HEIGHT = 1000
+# accepted drift of block timestamp into the future, in seconds
+MAX_FUTURE_BLOCK_TIME = 2 * 60 * 60
+# orphan blocks kept until their parent arrives, the oldest ones are evicted first
+MAX_ORPHAN_BLOCKS = 500
+MAX_ORPHAN_AGE = 20 * 60
+# chain state is written to a snapshot every SNAPSHOT_INTERVAL blocks of the best chain
+SNAPSHOT_INTERVAL = 100
+# undo data is kept for this many blocks of the best chain, deeper reorganizations are refused
+MAX_REORG_DEPTH = 100
 GENESIS_DATA_FILENAME = 'genesis_data.txt'
 class Blockchain:
-    def __init__(self, files_path, log, difficulty_bits):
+    def __init__(self, files_path, log, difficulty_bits, lazy_blocks=False, key_registry=None):
         self.__log = log
         self.__files_path = files_path
         self.__blockchain_head = []
+        self.__block_index = BlockIndex()
+        # entry of the head with the most cumulative work, updated on every connected block
+        self.__best_entry = None
+        # unspent outputs of the chain ending at best entry
+        self.__key_registry = key_registry if key_registry is not None else KeyRegistry()
+        self.__utxo_set = UtxoSet(self.__key_registry)
+        # location of every transaction of the chain ending at best entry
+        self.__transaction_index = TransactionIndex()
+        self.__reorg_engine = ReorgEngine(log, self.__utxo_set, self.__transaction_index, MAX_REORG_DEPTH)
+        # hashes of blocks of the chain ending at best entry, position is block height
+        self.__best_chain = self.__reorg_engine.get_best_chain()
+        self.__difficulty_bits = difficulty_bits
         self.__target = 2 ** (SHA_SIZE - difficulty_bits)
+        # expected number of hashes needed to find a block
+        self.__block_work = 2 ** SHA_SIZE // self.__target
         self.__time = time()
+        self.__block_log = BlockLog(files_path, log)
+        atexit.register(self.__block_log.close)
+        # in lazy mode only headers stay in memory, transactions are paged in from block log
+        self.__block_bodies = BlockBodyCache(self.__block_log, BLOCK_CACHE_SIZE) if lazy_blocks else None
+        self.__utxo_snapshot = UtxoSnapshot(files_path, log)
+        # height of the best chain when the last snapshot was written
+        self.__snapshot_height = 0
+        # snapshots are serialized and written by a background thread
+        self.__snapshot_writer = None
         self.__get_blockchain()
-        self.__orphan_list = []
+        # blocks disconnected while restoring chain state have no pool to return transactions to
+        self.__reorg_engine.pop_detached_transactions()
+        self.__orphan_pool = OrphanPool(MAX_ORPHAN_BLOCKS, MAX_ORPHAN_AGE)
 
     """
     Fetch or create blockchain at the beginning
     """
     def __get_blockchain(self):
         # read blockchain from file
-        # self.__read_blockchain()
+        self.__read_blockchain()
         # if file not contain blockchain, genesis block will be created
         if not self.__blockchain_head:
             self.__log.info("Create first block...")
             transactions = []
             for t in GENESIS_DATA['data']:
                 transactions.append(Transaction.from_dict_to_transaction(t))
-            self.__blockchain_head.append(Block(
+            genesis_block = Block(
                 None,
                 GENESIS_DATA['header']['nonce'],
                 transactions,
                 None
-            ))
-            self.__log.info(self.__blockchain_head[0].get_data().get_transactions())
-            self.__save_one_block(self.__blockchain_head[0])
+            )
+            self.__log.info(genesis_block.get_data().get_transactions())
+            self.__blockchain_head.append(genesis_block)
+            self.__connect_block(genesis_block)
         else:
+            self.__restore_chain_state()
             self.__log.info("Blockchain was loaded")
 
     """
-    Fetch or create blockchain after launch app 
+    Replay blocks from block log after launch app,
+    blocks are stored in order they were connected, so parent always goes first
+    Only block index, heads and best entry are rebuilt here, chain state is restored afterwards
     """
     def __read_blockchain(self):
-        try:
-            with open(f"{self.__files_path}/{BLOCKCHAIN_FILENAME}", 'r') as file:
-                json_str = ''
-                for line in file.read().splitlines():
-                    # every block is separated by hash character
-                    if line == '#':
-                        # add block as a head to blockchain
-                        self.__set_head_block(json_str)
-                        json_str = ''
-                    else:
-                        json_str += line.strip()
-        except FileNotFoundError:
-            self.__log.debug("Blockchain file {self.__files_path}/{BLOCKCHAIN_FILENAME} not found")
-        except json.decoder.JSONDecodeError:
-            self.__log.debug("Incorrect format of json")
+        start = time()
+        for block_hash, payload in self.__block_log.read_all():
+            try:
+                block_dict = json.loads(payload)
+            except json.decoder.JSONDecodeError:
+                self.__log.error(f"Incorrect format of block {block_hash}")
+                continue
+            previous_block_hash = block_dict['header']['previous_block_hash']
+            parent = self.__block_index.get(previous_block_hash)
+            if parent is None and self.__blockchain_head:
+                self.__log.error(f"Parent of stored block {block_hash} not found, skipping")
+                continue
+            previous_block = parent.get_block() if parent is not None else None
+            if self.__block_bodies is not None:
+                # record checksum was verified, stored hash is trusted,
+                # transactions are decoded only if chain state needs them
+                header = block_dict['header']
+                block = Block(
+                    previous_block_hash,
+                    header['nonce'],
+                    None,
+                    previous_block,
+                    block_hash=block_hash,
+                    data_loader=self.__block_bodies.get_loader(block_hash),
+                    version=header.get('version', BLOCK_VERSION_LEGACY),
+                    merkle_root=header.get('merkle_root'),
+                    timestamp=header.get('timestamp'),
+                    bits=header.get('bits')
+                )
+            else:
+                block = Block.from_dict_to_block(block_dict, previous_block)
+            if block.get_hash() != block_hash:
+                self.__log.error(f"Stored block {block_hash} has different hash, skipping")
+                continue
+            self.__connect_block(block, save=False)
+        if self.__blockchain_head:
+            self.__log.info(f"Loaded {len(self.__block_index)} blocks in {time() - start}s")
 
     """
-    Create block after reading and set as a head
+    Load chain state from the snapshot if it belongs to a stored block
+    and connect only blocks between it and the best head,
+    without a usable snapshot the state is rebuilt from genesis
     """
-    def __set_head_block(self, json_str_block):
-        json_block = json.loads(json_str_block)
-        block = Block (
-            json_block["header"]["previous_block_hash"],
-            json_block["header"]["nonce"],
-            [Transaction.from_dict_to_transaction(t) for t in json_block["data"]],
-            self.__blockchain_head
-        )
-        self.__blockchain_head.append(block)
+    def __restore_chain_state(self):
+        start = time()
+        best = None
+        snapshot = self.__utxo_snapshot.read()
+        if snapshot is not None:
+            block_hash, height, state = snapshot
+            entry = self.__block_index.get(block_hash)
+            if entry is not None and entry.get_height() == height:
+                self.__utxo_set.import_state(state['utxo'])
+                self.__transaction_index.import_state(state['transactions'])
+                self.__reorg_engine.set_best_chain(self.__get_chain_hashes(entry))
+                self.__snapshot_height = height
+                best = entry
+            else:
+                self.__log.error(f"UTXO snapshot block {block_hash} is not stored at height {height}, rebuilding chain state")
+        # best entry chosen while replaying blocks
+        target = self.__best_entry
+        if not self.__reorg_engine.switch(best, target):
+            self.__log.error(f"UTXO snapshot block {best.get_hash()} is too far from the best head, rebuilding chain state")
+            self.__utxo_set.import_state({'outputs': {}, 'undo': {}})
+            self.__transaction_index.import_state({})
+            self.__reorg_engine.set_best_chain([])
+            best = None
+            self.__reorg_engine.switch(best, target)
+        from_height = best.get_height() if best is not None else -1
+        self.__log.info(f"Chain state restored from height {from_height} to {target.get_height()} in {time() - start}s")
+        self.__write_snapshot_if_due()
+
+    def __get_chain_hashes(self, entry):
+        hashes = []
+        while entry is not None:
+            hashes.append(entry.get_hash())
+            entry = entry.get_parent()
+        hashes.reverse()
+        return hashes
+
+    """
+    Write chain state snapshot if the best chain grew by SNAPSHOT_INTERVAL blocks since the last one
+    and no snapshot is being written, state is copied here and written in background
+    """
+    def __write_snapshot_if_due(self):
+        height = len(self.__best_chain) - 1
+        if height - self.__snapshot_height < SNAPSHOT_INTERVAL or \
+                (self.__snapshot_writer is not None and self.__snapshot_writer.is_alive()):
+            return
+        state = {
+            'utxo': self.__utxo_set.export_state(),
+            'transactions': self.__transaction_index.export_state()
+        }
+        self.__snapshot_writer = Thread(target=self.__write_snapshot, args=(self.__best_entry.get_hash(), height, state))
+        self.__snapshot_writer.start()
 
     """
-    Save blockchain to file,
-    every block is a json and blocks are separeted by #
+    Blocks are flushed to block log first, so the snapshot block is always stored
     """
-    def __save_blockchain(self):
-        block = self.__blockchain_head
+    def __write_snapshot(self, block_hash, height, state):
         try:
-            open(f"{self.__files_path}/{BLOCKCHAIN_FILENAME}", 'w').close()
-            with open(f"{self.__files_path}/{BLOCKCHAIN_FILENAME}", 'a') as file:
-                while block is not None:
-                    json.dump(block.to_dict(), file, indent=4)
-                    file.write("\n#\n")
-                    block = block.get_previous_block()
-        except FileNotFoundError:
-            self.__log.debug("Block was not saved - file {self.__files_path}/{BLOCKCHAIN_FILENAME} not found")
+            self.__block_log.sync()
+            self.__utxo_snapshot.write(block_hash, height, state)
+            self.__snapshot_height = height
+            self.__log.info(f"UTXO snapshot written at height {height}")
+        except Exception as e:
+            self.__log.error(f"UTXO snapshot could not be written, reason: {e}")
 
     """
-    Save one block to blockchain file,
-    new block (head) is saved at the end of the blockchain file
+    Wait until snapshot being written in background is stored
+    """
+    def wait_for_snapshot(self):
+        writer = self.__snapshot_writer
+        if writer is not None:
+            writer.join()
+
+    """
+    Append one block to the block log
     """
     def __save_one_block(self, block):
-        try:
-            with open(f"{self.__files_path}/{BLOCKCHAIN_FILENAME}", 'a') as file:
-                json.dump(block.to_dict(), file, indent=4)
-                file.write("\n#\n")
-        except FileNotFoundError:
-            self.__log.debug("Block was not saved - file {self.__files_path}/{BLOCKCHAIN_FILENAME} not found")
+        payload = json.dumps(block.to_dict(), separators=(',', ':')).encode('utf-8')
+        self.__block_log.append(block.get_hash(), payload)
 
     """
     Return True if block is correctly
@@ -128,28 +245,56 @@ class Blockchain:
     def __valid_block(self, block):
         if block is None:
             return False
+        elif not block.get_header().is_well_formed():
+            self.__log.error("Candidate header has missing or malformed fields")
+            return False
         else:    
             # Check: hash(block) must meet expected target
             if int(block.get_hash(), 16) >= self.__target:
                 self.__log.error(f"Candidate does not meet target requirements, hash: {block.get_hash()} target: {self.__target}")
                 return False
+            header = block.get_header()
+            if header.get_version() != BLOCK_VERSION_LEGACY:
+                # Check: header declares expected difficulty and is not from the future
+                if header.get_bits() != self.__difficulty_bits:
+                    self.__log.error(f"Candidate has wrong difficulty bits: {header.get_bits()}")
+                    return False
+                if header.get_timestamp() > time() + MAX_FUTURE_BLOCK_TIME:
+                    self.__log.error(f"Candidate timestamp {header.get_timestamp()} is too far in the future")
+                    return False
+                # Check: header commits to block transactions
+                if not block.has_valid_merkle_root():
+                    self.__log.error(f"Candidate merkle root does not match transactions")
+                    return False
+        return True
+
+    '''
+    Legacy blocks are accepted only during the migration window,
+    orphans are checked against the current best height
+    '''
+    def __valid_legacy_block(self, block):
+        if block.get_header().get_version() != BLOCK_VERSION_LEGACY:
+            return True
+        parent = block.get_previous_block()
+        if parent is not None:
+            height = self.__block_index.get_height(parent.get_hash()) + 1
+        else:
+            height = self.__best_entry.get_height() + 1
+        if height > LEGACY_BLOCK_MAX_HEIGHT:
+            self.__log.error(f"Legacy block at height {height} is outside of migration window")
+            return False
         return True
     
     '''
     Searching of candidate's parent
-    Checking if any of blocks' hash in blockchain is a previous block hash of candidate block
-    '''
-    def __is_orphan_block(self, block):                       
-        for head in self.__blockchain_head:
-            block_from_blockchain = head
-            # verify every block from head to genesis block to find parent of new block
-            while block_from_blockchain is not None:
-                if block.get_header().get_previous_block_hash() == block_from_blockchain.get_hash():
-                    self.__log.info(f"Block has parent")
-                    block.set_previous_block(block_from_blockchain)
-                    return False
-                # change reference to verified block in direction of the beginning
-                block_from_blockchain = block_from_blockchain.get_previous_block()
+    Checking in block index if previous block hash of candidate block belongs to blockchain
+    '''
+    def __is_orphan_block(self, block):
+        parent = self.__block_index.get(block.get_header().get_previous_block_hash())
+        if parent is not None:
+            self.__log.info(f"Block has parent")
+            block.set_previous_block(parent.get_block())
+            return False
         self.__log.info(f"Block is orphan")
         return True
 
@@ -158,157 +303,66 @@ class Blockchain:
     '''
     def check_block(self, block_dict=None):
         if block_dict is not None:
-            block = Block(
-                previous_block_hash=block_dict['header']['previous_block_hash'],
-                transactions=[Transaction.from_dict_to_transaction(t) for t in block_dict['data']],
-                nonce=block_dict['header']['nonce'],
-                previous_block=None
-            )
+            block = Block.from_dict_to_block(block_dict)
 
             if self.__valid_block(block):
-                self.__log.info(f"Block is valid")
                 is_orphan = self.__is_orphan_block(block)
+                if not self.__valid_legacy_block(block):
+                    return False, False, block
+                self.__log.info(f"Block is valid")
                 return True, is_orphan, block
             else:
                 return False, False, block
         return False, False, None
 
     '''
-    Steps of addition a new block to orphan list:
-    1. Check if block has a family in orphan list
-    2. Check if new block is a parent and child at the same time - check parent of head and root block
+    Keep block without known parent in orphan pool until its parent arrives
     '''
     def add_to_orphan_list(self, block):
-        if block is not None:
-            #1
-            has_family, is_parent, is_child, orphan_blocks_to_add, orphan_blocks_to_remove = self.__is_part_of_family(block)
-            if has_family:
-                for block_to_add in orphan_blocks_to_add:
-                    self.__orphan_list.append(block_to_add)
-                            
-                for block_to_remove in orphan_blocks_to_remove:
-                    self.__orphan_list.remove(block_to_remove)
-            #2
-                if is_parent and is_child:
-                    orphan_blocks_to_remove = []
-                    for orphan_head in self.__orphan_list:
-                        for el in self.__orphan_list:
-                            orphan_block = el
-                            while orphan_block is not None:
-                                if orphan_block.get_previous_block() == None:
-                                    if orphan_head.get_hash() == orphan_block.get_header().get_previous_block_hash():
-                                        orphan_blocks_to_remove.append(orphan_head)                        
-                                orphan_block = orphan_block.get_previous_block()
-
-                    for block_to_remove in orphan_blocks_to_remove:
-                        self.__orphan_list.remove(block_to_remove)
-                    self.__log.info(f"Orphan list has been filtred through blocks that was parent and child")
-            else:
-                self.__orphan_list.append(block)
-
-    '''
-    Steps of checking if block is a family member:
-    1. Check if new block is a child of existing block in orphan list
-    2. Check if new block is a child of block from one of orphan's family member
-    3. Check if new block is a parent of root block from one of orphan's family member
-    '''
-    def  __is_part_of_family(self, new_block):   
-        orphan_blocks_to_add = []
-        orphan_blocks_to_remove = []
-        is_parent = False
-        is_child = False
-        is_part_of_family = False
-
-        if self.__orphan_list:
-            for orphan_head in self.__orphan_list:
-                #1, 2
-                orphan_block = orphan_head
-                while orphan_block is not None:
-                    if new_block.get_header().get_previous_block_hash() == orphan_block.get_hash():
-                        self.__log.info(f"New OrphanBlock has parent in orphan list")
-                        new_block.set_previous_block(orphan_block)
-                        orphan_blocks_to_add.append(new_block)
-                        is_part_of_family = True
-                        is_child = True
-                        if orphan_block == orphan_head:
-                            orphan_blocks_to_remove.append(orphan_block)
-                        break   
-                #3
-                    if orphan_block.get_previous_block() == None:
-                        if new_block.get_hash() == orphan_block.get_header().get_previous_block_hash():
-                            self.__log.info(f"New OrphanBlock is parent of root block from one block in orphan list")
-                            orphan_block.set_previous_block(new_block)
-                            is_part_of_family = True
-                            is_parent = True
-                    orphan_block = orphan_block.get_previous_block()        
-            return is_part_of_family, is_parent, is_child, orphan_blocks_to_add, orphan_blocks_to_remove
-
-        self.__log.info(f"New OrphanBlock doesnt have family in orphan list")
-        return is_part_of_family, is_parent, is_child, orphan_blocks_to_add, orphan_blocks_to_remove
+        if block is not None and self.__orphan_pool.add(block):
+            self.__log.info(f"Block {block.get_hash()} added to orphan pool")
 
     '''
     Steps of addition the new block to blockchain:
-    1. Check if new block is parent of root block of each block in orphan list
-    2. Add new block to file and if is a parent than add all blocks, from root to youngest child, to file 
-    3. If new block is not a parent it is automatically a new head of blockchain, 
-        if new block is a parent his youngest childs are heads (removing old head if his parent was a head and save new head)
-    4. If is a parent than remove orphan_head, which is his youngest family member, from orphan list
+    0. Block which is already connected is skipped, so it does not become a head twice
+    1. Connect new block
+    2. Connect orphans waiting for a connected block, parent always goes before its children
+    3. Every connected block replaces its parent in head list,
+        blocks still being heads afterwards are returned as new heads
     '''
     def add_block(self, new_block):
-        orphan_blocks_to_remove = []
-        head_blocks_to_remove = []
-        is_parent = False
         new_time = time()
         self.__log.info(f'New candidate await time: {new_time - self.__time}')
         self.__time = new_time
         new_head_list = []
-        if new_block is not None:
-            #1
-            if self.__orphan_list:
-                for orphan_head in self.__orphan_list:
-                    orphan_block = orphan_head
-                    while orphan_block is not None:
-                        if orphan_block.get_previous_block() == None:
-                            if new_block.get_hash() == orphan_block.get_header().get_previous_block_hash():
-                                self.__log.info(f"New Block is parent of root block from one/few blocks in orphan list")
-                                orphan_block.set_previous_block(new_block)
-                                orphan_blocks_to_remove.append(orphan_head)
-                                new_head_list.append(orphan_head)
-                                is_parent = True
-                        orphan_block = orphan_block.get_previous_block()        
-
-            if not is_parent:
-                self.__log.info(f"Block is not a parent of any orphan blocks")
-                new_head_list.append(new_block)
-            #2
+        if new_block is not None and self.__block_index.contains(new_block.get_hash()):
+            self.__log.info(f"Block {new_block.get_hash()} is already connected")
+        elif new_block is not None:
             self.__log.info("Saving new candidate")
-            self.__save_one_block(new_block)
-            for block_to_remove in orphan_blocks_to_remove:
-                orphan_to_blockchain = block_to_remove.get_previous_block()
-                while new_block.get_hash() != orphan_to_blockchain.get_header().get_previous_block_hash():
-                    self.__save_one_block(orphan_to_blockchain)
-                orphan_to_blockchain = orphan_to_blockchain.get_previous_block()
+            #1, 2
+            connected = [new_block]
+            position = 0
+            while position < len(connected):
+                block = connected[position]
+                position += 1
+                self.__connect_block(block)
+                for orphan_block in self.__orphan_pool.pop_children(block.get_hash()):
+                    orphan_block.set_previous_block(block)
+                    connected.append(orphan_block)
+            if len(connected) > 1:
+                self.__log.info(f"{len(connected) - 1} orphan block(s) connected")
             #3
-            for head in self.__blockchain_head:
-                if new_block.get_header().get_previous_block_hash() == head.get_hash():
-                    self.__log.info(f"Head blocks list is being updated")
-                    head_blocks_to_remove.append(head)
-                    break
-
-            bc_len_before = len(self.__blockchain_head)
-            for new_head in new_head_list:    
-                self.__blockchain_head.append(new_head) 
-
-            for block_to_remove in head_blocks_to_remove:
-                self.__blockchain_head.remove(block_to_remove)
-            bc_len_after = len(self.__blockchain_head)
-            if bc_len_before != bc_len_before:
-                self.__log.info(f"Number of created new branches = {bc_len_after-bc_len_before}")
-            #4
-            for block_to_remove in orphan_blocks_to_remove:
-                self.__orphan_list.remove(block_to_remove)
+            for block in connected:
+                self.__replace_head(block)
+            new_head_list = [block for block in connected if block in self.__blockchain_head]
         return new_head_list
 
+    def __replace_head(self, block):
+        parent = block.get_previous_block()
+        if parent in self.__blockchain_head:
+            self.__blockchain_head.remove(parent)
+        self.__blockchain_head.append(block)
+
     """
     Verify blockchain block by block,
     verification bases on __valid_blockchain function
@@ -327,54 +381,182 @@ class Blockchain:
         return self.__blockchain_head
 
     def get_blockchain_head(self):
-        longest_blockchain = self.__get_longest_blockchain()
-        return longest_blockchain
+        return self.__best_entry.get_block()
 
+    '''
+    Return orphans which are not parents of other orphans
+    '''
     def get_orphan_list(self):
-        return self.__orphan_list
+        return self.__orphan_pool.get_heads()
+
+    def get_orphan_pool_stats(self):
+        return self.__orphan_pool.get_stats()
 
     def get_previous_block(self, block):
         return block.get_previous_block()
 
+    '''
+    Add block to block index and save it to file
+    '''
+    def __connect_block(self, block, save=True):
+        entry = self.__block_index.add(block, self.__block_work)
+        if save:
+            # stored before best chain moves, so a snapshot never refers to a missing block
+            self.__save_one_block(block)
+            self.__update_best_entry(entry)
+        else:
+            # blocks read from file - heads are rebuilt while replaying,
+            # blocks are stored in order they arrived, so the best entry moves as it did before restart
+            self.__replace_head(block)
+            if self.__is_better_entry(entry) and self.__reorg_engine.can_switch(self.__best_entry, entry):
+                self.__best_entry = entry
+        if self.__block_bodies is not None:
+            block.get_data().page_out(self.__block_bodies.get_loader(block.get_hash()))
+        else:
+            # encodings cached while the block was validated are not needed any more
+            for transaction in block.get_data().get_transactions():
+                transaction.drop_encodings()
+
+    '''
+    Return True if entry has more cumulative work than best entry,
+    ties are broken by the lowest block hash
+    '''
+    def __is_better_entry(self, entry):
+        best = self.__best_entry
+        return best is None or \
+            entry.get_chain_work() > best.get_chain_work() or \
+            (entry.get_chain_work() == best.get_chain_work() and entry.get_hash() < best.get_hash())
+
+    '''
+    Move best head to given entry if it is better and the switch is not too deep
+    '''
+    def __update_best_entry(self, entry):
+        if self.__is_better_entry(entry):
+            if self.__reorg_engine.switch(self.__best_entry, entry):
+                self.__best_entry = entry
+                self.__write_snapshot_if_due()
+
+    '''
+    Return and forget transactions of blocks disconnected from the best chain
+    which are not on the new best chain
+    '''
+    def pop_detached_transactions(self):
+        return self.__reorg_engine.pop_detached_transactions()
+
+    def get_reorg_stats(self):
+        return self.__reorg_engine.get_stats()
+
+    def get_utxo_set(self):
+        return self.__utxo_set
+
+    def transaction_exists(self, transaction_id):
+        return self.__transaction_index.contains(transaction_id)
+
+    '''
+    Find transaction on the best chain by its id
+    Return (block hash, position, transaction) or None
+    '''
+    def get_transaction(self, transaction_id):
+        location = self.__transaction_index.get(transaction_id)
+        if location is None:
+            return None
+        block_hash, position = location
+        block = self.__block_index.get(block_hash).get_block()
+        return block_hash, position, block.get_data().get_transactions()[position]
+
     def get_block_count(self, concrete_branch_head=None):
         count = 0
         if concrete_branch_head is not None:
             current_block = concrete_branch_head
         else:
             current_block = self.get_blockchain_head()
+        entry = self.__block_index.get(current_block.get_hash())
+        if entry is not None:
+            return {"count": entry.get_height() + 1}
+        # block outside of blockchain (orphan), count blocks walking to its root
         while current_block is not None:
             count += 1
             current_block = current_block.get_previous_block()
         return {"count": count}
 
+    def get_block_index(self):
+        return self.__block_index
+
+    def get_best_height(self):
+        return len(self.__best_chain) - 1
+
     '''
-    Return currently the longest branch of blockchain
+    Return hashes of best chain blocks going back from the head,
+    the last ten one by one, then with doubling step, genesis is always the last one
     '''
-    def __get_longest_blockchain(self):
-        head_len_dict = {}
-        count = 0
-        block_head = self.__blockchain_head
-        for head in block_head:
-            current_block = head
-            while current_block is not None:
-                count += 1
-                current_block = current_block.get_previous_block()
-            head_len_dict[head] = count
-        head_hash_dict = {}
-        max_number_of_blocks = max(head_len_dict.values())
-        for head, value in head_len_dict.items():
-            if value == max_number_of_blocks:
-                head_hash_dict[head] = head.get_hash()
-        return min(head_hash_dict, key = head_hash_dict.get)
-
-    def __transaction_already_exist(self, transaction):
-        block = self.__get_longest_blockchain()
-        while block is not None:
-            for t in block.get_data().get_transactions():
-                if transaction.get_id() == t.get_id():
-                    return True
-            block = block.get_previous_block()
-        return False
+    def get_block_locator(self):
+        locator = []
+        height = len(self.__best_chain) - 1
+        step = 1
+        while height > 0:
+            locator.append(self.__best_chain[height])
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        locator.append(self.__best_chain[0])
+        return locator
+
+    '''
+    Return up to limit headers of best chain blocks after the first locator hash found on the best chain,
+    every header is a dictionary with block hash added
+    '''
+    def get_headers(self, locator, limit):
+        start = 0
+        for block_hash in locator:
+            height = self.__block_index.get_height(block_hash)
+            if height is not None and height < len(self.__best_chain) and self.__best_chain[height] == block_hash:
+                start = height + 1
+                break
+        headers = []
+        for block_hash in self.__best_chain[start:start + limit]:
+            header = self.__block_index.get(block_hash).get_block().get_header().to_dict()
+            header['hash'] = block_hash
+            headers.append(header)
+        return headers
+
+    '''
+    Check header received at given height
+    Newer headers are hashed to check proof of work, difficulty and time,
+    hash of a legacy block covers transactions, so a legacy header is checked only with its block
+    '''
+    def check_header(self, header_dict, height, block_dict=None):
+        if header_dict.get('version', BLOCK_VERSION_LEGACY) == BLOCK_VERSION_LEGACY:
+            if block_dict is None or height > LEGACY_BLOCK_MAX_HEIGHT:
+                return False
+            block = Block.from_dict_to_block(block_dict)
+            if block.get_header().get_version() != BLOCK_VERSION_LEGACY or \
+                    block.get_header().get_previous_block_hash() != header_dict.get('previous_block_hash') or \
+                    block.get_hash() != header_dict.get('hash') or int(block.get_hash(), 16) >= self.__target:
+                self.__log.error(f"Legacy header {header_dict.get('hash')} does not match its block or target")
+                return False
+            return True
+        header = Block.Header(
+            header_dict.get('previous_block_hash'),
+            header_dict.get('nonce'),
+            header_dict.get('version'),
+            header_dict.get('merkle_root'),
+            header_dict.get('timestamp'),
+            header_dict.get('bits')
+        )
+        if not header.is_well_formed():
+            self.__log.error(f"Header {header_dict.get('hash')} has missing or malformed fields")
+            return False
+        block_hash = sha256(header.pack()).hexdigest()
+        if block_hash != header_dict.get('hash') or int(block_hash, 16) >= self.__target:
+            self.__log.error(f"Header {header_dict.get('hash')} does not meet target requirements")
+            return False
+        if header.get_bits() != self.__difficulty_bits or header.get_timestamp() > time() + MAX_FUTURE_BLOCK_TIME:
+            self.__log.error(f"Header {block_hash} has wrong difficulty bits or timestamp")
+            return False
+        return True
+
+    def get_block_cache_stats(self):
+        return self.__block_bodies.get_stats() if self.__block_bodies is not None else {}
 
     '''
     Get all branches from blockchain's heads and visualize it on website
@@ -403,7 +585,7 @@ class Blockchain:
     '''
     def visualize_orphan_list(self):
         tree_struct = []
-        orphan_list_head = self.__orphan_list
+        orphan_list_head = self.get_orphan_list()
         for head in orphan_list_head:
             block = head
             count = self.get_block_count(head)['count'] - 1
@@ -0,0 +1,232 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from time import time
+from model.block import Block, BLOCK_VERSION_LEGACY
+from model.gossip import INV_BLOCK
+
+# headers requested from a peer at once
+HEADERS_BATCH = 500
+# blocks requested from a peer at once
+BODIES_BATCH = 50
+# batches of blocks being downloaded ahead of the one being connected
+BODIES_WINDOW = 8
+BODY_THREADS = 4
+
+SYNC_IDLE = 'idle'
+SYNC_HEADERS = 'headers'
+SYNC_BODIES = 'bodies'
+SYNC_DONE = 'done'
+SYNC_FAILED = 'failed'
+
+class ChainSync:
+    """
+    Initial download of the chain from peers
+    Headers are downloaded in batches from one peer at a time and their proof of work is checked
+    before any block is requested, then blocks are downloaded in parallel from all peers
+    in batches of BODIES_BATCH and connected in order of headers
+    Legacy headers are hashed over the whole block, so their blocks are downloaded with them
+    A batch which could not be downloaded from a peer or does not match its headers
+    is requested from the next one
+    """
+    def __init__(self, log, key_manager, peer_client, blockchain, signature_verifier, miner, gossip):
+        self.__log = log
+        self.__gossip = gossip
+        self.__key_manager = key_manager
+        self.__peer_client = peer_client
+        self.__blockchain = blockchain
+        self.__signature_verifier = signature_verifier
+        self.__miner = miner
+        self.__executor = ThreadPoolExecutor(max_workers=BODY_THREADS, thread_name_prefix='sync')
+        self.__lock = Lock()
+        self.__thread = None
+        self.__status = self.__new_status(SYNC_IDLE)
+
+    def __new_status(self, state):
+        return {
+            'state': state,
+            'peers': 0,
+            'headers': 0,
+            'blocks_downloaded': 0,
+            'blocks_connected': 0,
+            'start_height': self.__blockchain.get_best_height(),
+            'target_height': self.__blockchain.get_best_height(),
+            'started': time(),
+            'finished': None,
+            'error': None
+        }
+
+    def __update_status(self, **values):
+        with self.__lock:
+            self.__status.update(values)
+
+    def __add_to_status(self, key, value):
+        with self.__lock:
+            self.__status[key] += value
+
+    """
+    Start synchronization in background, return False if it is already running
+    """
+    def start(self):
+        with self.__lock:
+            if self.__thread is not None and self.__thread.is_alive():
+                return False
+            self.__status = self.__new_status(SYNC_HEADERS)
+            self.__thread = Thread(target=self.__sync)
+            self.__thread.start()
+            return True
+
+    def __get_peers(self):
+        own_ip = self.__key_manager.get_own_ip()
+        return [el['ip'] for el in self.__key_manager.get_pub_key_list()['entries'] if el['ip'] != own_ip]
+
+    def __sync(self):
+        try:
+            peers = self.__get_peers()
+            self.__update_status(peers=len(peers))
+            headers, legacy_blocks = self.__download_headers(peers)
+            self.__update_status(state=SYNC_BODIES)
+            connected = self.__download_blocks(peers, headers, legacy_blocks)
+            if connected:
+                self.__miner.restore_detached_transactions()
+                self.__miner.reset_miner_after_new_candidate_request(False)
+            self.__update_status(state=SYNC_DONE, finished=time())
+            self.__log.info(f"Chain synchronized, {connected} block(s) connected")
+        except Exception as e:
+            self.__log.error(f"Chain synchronization failed, reason: {e}")
+            self.__update_status(state=SYNC_FAILED, finished=time(), error=str(e))
+
+    def __request_headers(self, ip, locator):
+        res = self.__peer_client.post(ip, '/headers', {'locator': locator, 'limit': HEADERS_BATCH})
+        if not res.ok:
+            raise Exception(f"HTTP {res.status_code}")
+        return res.json()
+
+    """
+    Return (headers, legacy blocks) of blocks unknown to this node, every header follows its parent,
+    legacy blocks {hash: block dictionary} were downloaded to check their headers
+    A batch of a peer which fails or contains a header which does not link or fails the check
+    is dropped and headers are requested from the next peer
+    """
+    def __download_headers(self, peers):
+        base_locator = self.__blockchain.get_block_locator()
+        headers = []
+        legacy_blocks = {}
+        # hash -> height of downloaded headers
+        heights = {}
+        for ip in peers:
+            while True:
+                locator = [headers[-1]['hash']] + base_locator if headers else base_locator
+                try:
+                    batch = self.__request_headers(ip, locator)
+                    accepted, batch_blocks = self.__check_headers(ip, batch, heights)
+                except Exception as e:
+                    self.__log.error(f"Headers from {ip} dropped, reason: {e}")
+                    break
+                for header, height in accepted:
+                    heights[header['hash']] = height
+                    headers.append(header)
+                legacy_blocks.update(batch_blocks)
+                self.__update_status(
+                    headers=len(headers),
+                    target_height=max([self.__blockchain.get_best_height()] + list(heights.values()))
+                )
+                if not accepted or len(batch) < HEADERS_BATCH:
+                    break
+        return headers, legacy_blocks
+
+    """
+    Return [(header, height)] of headers in batch unknown so far and blocks of legacy ones,
+    raise exception if any header does not link or fails the check
+    """
+    def __check_headers(self, ip, batch, heights):
+        block_index = self.__blockchain.get_block_index()
+        accepted = []
+        batch_heights = {}
+        for header in batch:
+            block_hash = header['hash']
+            if block_hash in heights or block_hash in batch_heights or block_index.contains(block_hash):
+                continue
+            parent_hash = header['previous_block_hash']
+            parent_height = batch_heights.get(parent_hash, heights.get(parent_hash, block_index.get_height(parent_hash)))
+            if parent_height is None:
+                raise Exception(f"Header {block_hash} does not link to known headers")
+            batch_heights[block_hash] = parent_height + 1
+            accepted.append((header, parent_height + 1))
+        legacy_hashes = [h['hash'] for h, _ in accepted if h.get('version', BLOCK_VERSION_LEGACY) == BLOCK_VERSION_LEGACY]
+        blocks = {}
+        if legacy_hashes:
+            block_dicts = self.__gossip.request_data(ip, [(INV_BLOCK, block_hash) for block_hash in legacy_hashes])['blocks']
+            blocks = {Block.from_dict_to_block(d).get_hash(): d for d in block_dicts}
+        for header, height in accepted:
+            if not self.__blockchain.check_header(header, height, blocks.get(header['hash'])):
+                raise Exception(f"Header {header['hash']} is not valid")
+        return accepted, blocks
+
+    """
+    Download blocks with given hashes from peers starting with the one at given position,
+    return block dictionaries in order of hashes
+    Every block has to hash to its header and its transactions to the merkle root of the header
+    """
+    def __fetch_blocks(self, peers, position, hashes, legacy_blocks):
+        if all(block_hash in legacy_blocks for block_hash in hashes):
+            return [legacy_blocks[block_hash] for block_hash in hashes]
+        for i in range(len(peers)):
+            ip = peers[(position + i) % len(peers)]
+            try:
+                blocks = self.__gossip.request_data(ip, [(INV_BLOCK, block_hash) for block_hash in hashes])['blocks']
+                if len(blocks) != len(hashes):
+                    raise Exception(f"{len(hashes) - len(blocks)} block(s) missing")
+                for block_hash, block_dict in zip(hashes, blocks):
+                    block = Block.from_dict_to_block(block_dict)
+                    if block.get_hash() != block_hash or not block.has_valid_merkle_root():
+                        raise Exception(f"Block {block_hash} does not match its header")
+                self.__add_to_status('blocks_downloaded', len(blocks))
+                return blocks
+            except Exception as e:
+                self.__log.error(f"Downloading blocks from {ip} failed, reason: {e}")
+        raise Exception(f"Blocks after {hashes[0]} could not be downloaded from any peer")
+
+    """
+    Check downloaded blocks and connect them, return number of connected blocks,
+    blocks match their headers, so a block which is not valid fails the whole sync
+    """
+    def __connect_blocks(self, hashes, block_dicts):
+        transactions = [t for d in block_dicts for t in Block.from_dict_to_block(d).get_data().get_transactions()]
+        if not all(self.__signature_verifier.verify_transactions(transactions)):
+            raise Exception(f"Blocks after {hashes[0]} contain transaction with invalid signature")
+        connected = 0
+        for block_hash, block_dict in zip(hashes, block_dicts):
+            # block may have been relayed meanwhile
+            if self.__blockchain.get_block_index().contains(block_hash):
+                continue
+            block_valid, is_orphan, block = self.__blockchain.check_block(block_dict)
+            if not block_valid or is_orphan or block.get_hash() != block_hash:
+                raise Exception(f"Block {block_hash} is not valid")
+            self.__blockchain.add_block(block)
+            connected += 1
+        self.__add_to_status('blocks_connected', connected)
+        return connected
+
+    def __download_blocks(self, peers, headers, legacy_blocks):
+        hashes = [h['hash'] for h in headers]
+        batches = [hashes[i:i + BODIES_BATCH] for i in range(0, len(hashes), BODIES_BATCH)]
+        pending = deque()
+        connected = 0
+        for position, batch in enumerate(batches):
+            pending.append((batch, self.__executor.submit(self.__fetch_blocks, peers, position, batch, legacy_blocks)))
+            if len(pending) >= BODIES_WINDOW:
+                batch, future = pending.popleft()
+                connected += self.__connect_blocks(batch, future.result())
+        while pending:
+            batch, future = pending.popleft()
+            connected += self.__connect_blocks(batch, future.result())
+        return connected
+
+    def get_status(self):
+        with self.__lock:
+            status = dict(self.__status)
+        status['current_height'] = self.__blockchain.get_best_height()
+        end = status['finished'] if status['finished'] is not None else time()
+        status['elapsed'] = round(end - status['started'], 3)
+        return status
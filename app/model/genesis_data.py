@@ -1,4 +1,7 @@
 import json
+# Genesis transactions have no version field, so they are read as legacy (version 1)
+# transactions hashed with str(dict). Genesis block hash commits to that encoding,
+# therefore they are never re-encoded - only new transactions use canonical encoding.
 GENESIS_DATA = json.loads('''{
     "header": {
         "previous_block_hash": null,
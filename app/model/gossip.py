@@ -0,0 +1,205 @@
+from threading import Lock, Thread
+from model.block import Block
+from model.seen_set import SeenSet
+
+# kinds of inventory items
+INV_BLOCK = 'block'
+INV_TRANSACTION = 'transaction'
+
+# announced items are remembered for SEEN_TTL seconds
+SEEN_TTL = 600
+SEEN_MAX_SIZE = 100000
+
+class Gossip:
+    """
+    Inventory based relay of blocks and transactions
+    Nodes announce hashes of blocks and ids of transactions through /inv,
+    peers fetch only items they do not have yet through /getdata of the announcing node
+    and announce accepted items further
+    Seen set makes every item fetched and validated at most once
+    Fetched items carry key ids instead of public keys,
+    public keys of unknown key ids are requested from the peer through /keys
+    """
+    def __init__(self, log, key_manager, peer_client, blockchain, miner, key_registry):
+        self.__log = log
+        self.__key_registry = key_registry
+        self.__key_manager = key_manager
+        self.__peer_client = peer_client
+        self.__blockchain = blockchain
+        self.__miner = miner
+        self.__seen = SeenSet(SEEN_TTL, SEEN_MAX_SIZE)
+        # stats are updated from request and fetch threads
+        self.__lock = Lock()
+        self.__stats = {
+            'announced': 0,
+            'received': 0,
+            'requested': 0,
+            'duplicates': 0,
+            'accepted': 0,
+            'rejected': 0
+        }
+
+    def __add_to_stats(self, **values):
+        with self.__lock:
+            for key, value in values.items():
+                self.__stats[key] += value
+
+    def __has_item(self, kind, hash):
+        if kind == INV_BLOCK:
+            return self.__blockchain.get_block_index().contains(hash)
+        return self.__miner.has_transaction(hash)
+
+    """
+    Announce items [(kind, hash)] to all peers except given ip
+    """
+    def announce(self, items, exclude_ip=None):
+        for kind, hash in items:
+            self.__seen.add((kind, hash))
+        own_ip = self.__key_manager.get_own_ip()
+        ips = [
+            el['ip'] for el in self.__key_manager.get_pub_key_list()['entries']
+            if el['ip'] not in (own_ip, exclude_ip)
+        ]
+        body = {
+            'ip': own_ip,
+            'inventory': [{'type': kind, 'hash': hash} for kind, hash in items]
+        }
+        self.__add_to_stats(announced=len(items))
+        self.__peer_client.broadcast(ips, '/inv', body)
+
+    """
+    Add transaction created by this node to own pool and announce it
+    """
+    def publish_transaction(self, transaction_dict):
+        self.__miner.append_transaction(transaction_dict)
+        self.announce([(INV_TRANSACTION, transaction_dict['id'])])
+
+    """
+    Handle announcement of a peer, missing items are fetched in background
+    """
+    def handle_inv(self, request_data):
+        ip = request_data['ip']
+        missing = []
+        for item in request_data['inventory']:
+            kind, hash = item['type'], item['hash']
+            self.__add_to_stats(received=1)
+            if kind not in (INV_BLOCK, INV_TRANSACTION):
+                raise Exception(f"Unknown inventory type {kind}")
+            if self.__has_item(kind, hash) or not self.__seen.add((kind, hash)):
+                self.__add_to_stats(duplicates=1)
+                continue
+            missing.append((kind, hash))
+        if missing:
+            Thread(target=self.__fetch_items, args=(ip, missing)).start()
+        return f"{len(missing)} item(s) requested"
+
+    """
+    Request items [(kind, hash)] from given node in compact encoding,
+    return its blocks and transactions with public keys restored
+    """
+    def request_data(self, ip, items):
+        res = self.__peer_client.post(ip, '/getdata', {
+            'inventory': [{'type': kind, 'hash': hash} for kind, hash in items],
+            'key_ids': True
+        })
+        if not res.ok:
+            raise Exception(f"HTTP {res.status_code}")
+        data = res.json()
+        blocks = data.get('blocks', [])
+        transactions = data.get('transactions', [])
+        unknown_ids = self.__key_registry.get_unknown_ids(
+            [t for b in blocks for t in b['data']] + transactions
+        )
+        if unknown_ids:
+            res = self.__peer_client.post(ip, '/keys', {'ids': unknown_ids})
+            if not res.ok:
+                raise Exception(f"HTTP {res.status_code}")
+            # keys which were not asked for are ignored, so a peer can not fill the registry
+            keys = res.json()['keys']
+            self.__key_registry.add_keys({key_id: keys[key_id] for key_id in map(str, unknown_ids) if key_id in keys})
+        return {
+            'blocks': [self.__key_registry.expand_block(b) for b in blocks],
+            'transactions': [self.__key_registry.expand_transaction(t) for t in transactions]
+        }
+
+    def __fetch_items(self, ip, items):
+        self.__add_to_stats(requested=len(items))
+        try:
+            data = self.request_data(ip, items)
+        except Exception as e:
+            self.__log.error(f"Fetching inventory from {ip} failed, reason: {e}")
+            # let other announcements of these items be fetched
+            for item in items:
+                self.__seen.remove(item)
+            return
+
+        accepted = []
+        # items validated by this node, accepted or not
+        processed = set()
+        for block_dict in data.get('blocks', []):
+            try:
+                item = (INV_BLOCK, Block.from_dict_to_block(block_dict).get_hash())
+                if item not in items:
+                    continue
+                block = self.__miner.verify_and_save_candidate(block_dict)
+                processed.add(item)
+                if block is not None:
+                    accepted.append(item)
+            except Exception as e:
+                self.__log.error(f"Fetched block could not be processed, reason: {e}")
+        for transaction_dict in data.get('transactions', []):
+            item = (INV_TRANSACTION, transaction_dict.get('id'))
+            if item not in items:
+                continue
+            processed.add(item)
+            try:
+                self.__miner.append_transaction(transaction_dict)
+                accepted.append(item)
+            except Exception as e:
+                self.__log.info(f"Fetched transaction not accepted: {e}")
+        # items which were not delivered or failed can be fetched after another announcement
+        for item in items:
+            if item not in processed:
+                self.__seen.remove(item)
+        self.__add_to_stats(accepted=len(accepted), rejected=len(processed) - len(accepted))
+        if accepted:
+            self.announce(accepted, exclude_ip=ip)
+
+    """
+    Return requested blocks and transactions known to this node,
+    with key ids instead of public keys if requested
+    """
+    def get_data(self, request_data):
+        blocks = []
+        transactions = []
+        for item in request_data['inventory']:
+            kind, hash = item['type'], item['hash']
+            if kind == INV_BLOCK:
+                entry = self.__blockchain.get_block_index().get(hash)
+                if entry is not None:
+                    blocks.append(entry.get_block().to_dict())
+            elif kind == INV_TRANSACTION:
+                transaction = self.__miner.get_transaction(hash)
+                if transaction is not None:
+                    transactions.append(transaction.to_dict(True))
+        if request_data.get('key_ids'):
+            blocks = [self.__key_registry.compact_block(b) for b in blocks]
+            transactions = [self.__key_registry.compact_transaction(t) for t in transactions]
+        return {'blocks': blocks, 'transactions': transactions}
+
+    """
+    Return public keys of requested key ids known to this node
+    """
+    def get_keys(self, request_data):
+        keys = {}
+        for key_id in request_data['ids']:
+            pem = self.__key_registry.get_pem(int(key_id))
+            if pem is not None:
+                keys[key_id] = pem
+        return {'keys': keys}
+
+    def get_stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats['seen'] = len(self.__seen)
+        return stats
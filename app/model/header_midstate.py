@@ -0,0 +1,19 @@
+from hashlib import sha256
+from model.block import HEADER_NONCE
+
+class HeaderMidstate:
+    """
+    Sha256 state after the header bytes preceding the nonce
+    Every proof-of-work attempt only hashes the nonce bytes
+    Built from the header prefix alone, so it can be sent to mining workers
+    """
+    def __init__(self, header_prefix):
+        self.__midstate = sha256(header_prefix)
+
+    """
+    Return hash of the header with given nonce as an integer
+    """
+    def hash_nonce(self, nonce):
+        hash = self.__midstate.copy()
+        hash.update(HEADER_NONCE.pack(nonce))
+        return int.from_bytes(hash.digest(), 'big')
@@ -3,18 +3,22 @@ from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from Crypto.Random import get_random_bytes
-from requests import post
 from os import environ
 import base64, json
 from flask import jsonify
+from model.verifying_key_cache import VerifyingKeyCache
+from model.peer_client import PeerClient
 
 import logging
 
 KEYS_FILENAME = 'keys.json'
+# parsed keys of most active senders
+VERIFYING_KEY_CACHE_SIZE = 128
 
 class KeyManager:
-    def __init__(self, secret, files_path, log):
+    def __init__(self, secret, files_path, log, peer_client=None):
         self.__log = log
+        self.__peer_client = peer_client or PeerClient(log)
         self.__priv_key = None
         self.__pub_key = None
         self.__secret = secret
@@ -23,6 +27,7 @@ class KeyManager:
         self.__pub_key_list = { 
             'entries': []
         }
+        self.__verifying_keys = VerifyingKeyCache(VERIFYING_KEY_CACHE_SIZE)
         self.__get_keys()
         self.__init_network()
     
@@ -111,23 +116,6 @@ class KeyManager:
                 return entry['pub_key']
         return None
 
-    """
-    Sending update requests for specific node
-    """
-    def __request_pub_key_list_update(self, ip):
-        if ip != self.__ip:
-            self.__log.info(f"Requesting pub key update for ip {ip}")
-            try:
-                res = post(self.format_ip(ip, 'update'), json = self.__pub_key_list)
-                return True if res.ok else False
-
-            except Exception as e:
-                self.__log.error(f"Pub key request for ip {ip} failed, reason: {e}")
-                return False
-
-        self.__log.info(f"Ip matches host's ip, skipping")
-        return True
-
     """
     Updating pub key list
     """
@@ -144,15 +132,16 @@ class KeyManager:
         self.__pub_key_list = new_pub_key_list
 
     """
-    Calling method to send update requests for every node in foreach loop
+    Sending update requests to every other node concurrently
     """
     def __request_pub_key_list_updates(self):
-        self.__log.info(f"Starting process for updating connected nodes' public key lists, node count: {len(self.__pub_key_list) - 1}") # minus current node's ip
-        for el in self.__pub_key_list['entries']:
-            res = self.__request_pub_key_list_update(el['ip'])
-            if not res:
+        ips = [el['ip'] for el in self.__pub_key_list['entries'] if el['ip'] != self.__ip]
+        self.__log.info(f"Starting process for updating connected nodes' public key lists, node count: {len(ips)}")
+        responses = self.__peer_client.broadcast(ips, 'update', self.__pub_key_list)
+        for ip in ips:
+            if responses[ip] is None or not responses[ip].ok:
                 self.__log.info(f"Public key update process failed")
-                return False, el['ip']
+                return False, ip
         return True, None
 
     """
@@ -166,7 +155,7 @@ class KeyManager:
         if pub_key is None:
             return False
         try:
-            vk = VerifyingKey.from_pem(pub_key)
+            vk = self.__verifying_keys.get(pub_key)
             decrypted_message = base64.b64decode(signed_message.encode('utf-8'))
             return vk.verify(decrypted_message, message.encode('utf-8'))
 
@@ -174,6 +163,12 @@ class KeyManager:
             self.__log.error(f"Veryfing massage failed, reason: {e}")
             return False
 
+    """
+    Getter for verifying key cache statistics
+    """
+    def get_verifying_key_cache_stats(self):
+        return self.__verifying_keys.get_stats()
+
     """
     Formating to URL endpoint of specific node
     """
@@ -220,7 +215,7 @@ class KeyManager:
 
         try:
             self.__log.info(f"Sending request to join network to target node: {ip}")
-            res = post(self.format_ip(ip, 'join'), json = body)
+            res = self.__peer_client.post(ip, 'join', body)
             if res.ok:
                 self.__log.info(f"Sucessfully joined new network")
                 return jsonify(self.get_pub_key_list())
@@ -262,7 +257,7 @@ class KeyManager:
         }
 
         try:
-            res = post(self.format_ip(ip, '/verify-message-from-node'), json = body)
+            res = self.__peer_client.post(ip, '/verify-message-from-node', body)
             if res.ok:
                 self.__log.info(f"Got: {res.content}")
                 return res.content
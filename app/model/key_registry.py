@@ -0,0 +1,127 @@
+from hashlib import sha256
+from threading import Lock
+
+"""
+Return key id of public key PEM - its sha256 as int,
+the whole hash is kept so a second key with the same id cannot be searched for
+"""
+def get_key_id(pem):
+    return int.from_bytes(sha256(pem.encode('utf-8')).digest(), 'big')
+
+class KeyRegistry:
+    """
+    Node wide mapping of public key PEM <-> key id derived from its hash
+    Indexes keep key ids instead of PEMs and compact wire format of blocks and transactions
+    carries key ids, a PEM received for an id is accepted only if it hashes to that id
+    The registry is not bounded, keys are added only for owners of connected blocks
+    and for key ids of data requested by this node
+    """
+    def __init__(self):
+        self.__lock = Lock()
+        # PEM -> key id
+        self.__ids = {}
+        # key id -> PEM
+        self.__pems = {}
+
+    """
+    Return key id of PEM and remember the PEM
+    """
+    def get_id(self, pem):
+        key_id = self.__ids.get(pem)
+        if key_id is not None:
+            return key_id
+        key_id = get_key_id(pem)
+        with self.__lock:
+            known = self.__pems.get(key_id)
+            if known is not None and known != pem:
+                raise Exception(f"Key id {key_id} is already used by another public key")
+            self.__pems[key_id] = pem
+            self.__ids[pem] = key_id
+        return key_id
+
+    """
+    Return key id of PEM without remembering it,
+    keys of outputs restored from a snapshot are not registered until they are used again
+    """
+    def find_id(self, pem):
+        key_id = self.__ids.get(pem)
+        return key_id if key_id is not None else get_key_id(pem)
+
+    def get_pem(self, key_id):
+        return self.__pems.get(key_id)
+
+    """
+    Register PEMs received for key ids {key id: PEM},
+    return number of registered keys
+    """
+    def add_keys(self, keys):
+        registered = 0
+        for key_id, pem in keys.items():
+            if get_key_id(pem) != int(key_id):
+                raise Exception(f"Public key does not match key id {key_id}")
+            self.get_id(pem)
+            registered += 1
+        return registered
+
+    """
+    Return transaction dictionary with owners replaced by key ids
+    """
+    def compact_transaction(self, transaction_dict):
+        compact = dict(transaction_dict)
+        compact['inputs'] = [
+            dict(i, current_owner=self.get_id(i['current_owner'])) for i in transaction_dict['inputs']
+        ]
+        output = transaction_dict['output']
+        compact['output'] = dict(
+            output,
+            new_owner=self.get_id(output['new_owner']),
+            current_owner=self.get_id(output['current_owner'])
+        )
+        return compact
+
+    """
+    Revert compact_transaction, unknown key ids raise exception
+    """
+    def expand_transaction(self, transaction_dict):
+        expanded = dict(transaction_dict)
+        expanded['inputs'] = [
+            dict(i, current_owner=self.__expand(i['current_owner'])) for i in transaction_dict['inputs']
+        ]
+        output = transaction_dict['output']
+        expanded['output'] = dict(
+            output,
+            new_owner=self.__expand(output['new_owner']),
+            current_owner=self.__expand(output['current_owner'])
+        )
+        return expanded
+
+    def __expand(self, owner):
+        # PEMs are passed through, so both encodings can be mixed
+        if isinstance(owner, str):
+            return owner
+        pem = self.__pems.get(owner)
+        if pem is None:
+            raise Exception(f"Unknown key id {owner}")
+        return pem
+
+    def compact_block(self, block_dict):
+        return dict(block_dict, data=[self.compact_transaction(t) for t in block_dict['data']])
+
+    def expand_block(self, block_dict):
+        return dict(block_dict, data=[self.expand_transaction(t) for t in block_dict['data']])
+
+    """
+    Return key ids used by compact transaction dictionaries which are not known
+    """
+    def get_unknown_ids(self, transaction_dicts):
+        owners = set()
+        for t in transaction_dicts:
+            owners.update(i['current_owner'] for i in t['inputs'])
+            owners.update((t['output']['new_owner'], t['output']['current_owner']))
+        return [o for o in owners if not isinstance(o, str) and o not in self.__pems]
+
+    def get_stats(self):
+        return {'keys': len(self.__pems)}
+
+    def __len__(self):
+        return len(self.__pems)
@@ -0,0 +1,177 @@
+from bisect import bisect_left, insort
+from itertools import count
+from threading import RLock
+
+# reason codes of rejected transactions
+REJECT_DUPLICATE = 'duplicate'
+REJECT_CONFLICT = 'conflict'
+REJECT_POOL_FULL = 'pool-full'
+REJECT_COINBASE = 'coinbase'
+REJECT_NO_INPUTS = 'no-inputs'
+REJECT_ALREADY_MINED = 'already-mined'
+REJECT_FOREIGN_INPUT = 'foreign-input'
+REJECT_MISSING_INPUT = 'missing-input'
+REJECT_INPUT_AMOUNT = 'input-amount'
+REJECT_AMOUNT_MISMATCH = 'amount-mismatch'
+REJECT_INVALID_SIGNATURE = 'invalid-signature'
+
+class Mempool:
+    """
+    Pool of transactions waiting to be mined keyed by transaction id
+    Transactions are kept ordered by fee rate and fee, highest first,
+    and indexed by spent input (previous transaction id, owner)
+    When a size cap is exceeded transactions with the lowest fee rate are evicted
+    """
+    def __init__(self, max_transactions, max_bytes):
+        self.__lock = RLock()
+        self.__max_transactions = max_transactions
+        self.__max_bytes = max_bytes
+        # transaction id -> transaction
+        self.__transactions = {}
+        # transaction id -> sort key
+        self.__keys = {}
+        # sort keys of all transactions, best first
+        self.__order = []
+        # (previous transaction id, owner) -> id of transaction spending it
+        self.__spent_inputs = {}
+        # transaction id -> hash of the best chain tip the transaction was checked on or None
+        self.__tip_hashes = {}
+        self.__size = 0
+        # arrival sequence keeps order of transactions with equal fees
+        self.__sequence = count()
+        self.__evicted = 0
+        # changed on every insertion and removal
+        self.__version = 0
+
+    """
+    Return outpoints (previous transaction id, owner) spent by transaction
+    """
+    def get_outpoints(transaction):
+        return [(i.get_previous_id(), i.get_current_owner()) for i in transaction.get_inputs()]
+
+    def __get_size(self, transaction):
+        return len(transaction.get_serialized(True))
+
+    def __sort_key(self, transaction):
+        fee_rate = transaction.get_fee() / self.__get_size(transaction)
+        return (-fee_rate, -transaction.get_fee(), next(self.__sequence), transaction.get_id())
+
+    """
+    Add transaction checked on the chain ending at given tip to the pool,
+    return None or reason code of rejection if a transaction with the same id
+    or spending one of its inputs is already in the pool or if it was evicted at once
+    """
+    def add(self, transaction, tip_hash=None):
+        with self.__lock:
+            transaction_id = transaction.get_id()
+            if transaction_id in self.__transactions:
+                return REJECT_DUPLICATE
+            if any(o in self.__spent_inputs for o in Mempool.get_outpoints(transaction)):
+                return REJECT_CONFLICT
+            key = self.__sort_key(transaction)
+            self.__transactions[transaction_id] = transaction
+            self.__keys[transaction_id] = key
+            self.__tip_hashes[transaction_id] = tip_hash
+            insort(self.__order, key)
+            for outpoint in Mempool.get_outpoints(transaction):
+                self.__spent_inputs[outpoint] = transaction_id
+            self.__size += self.__get_size(transaction)
+            self.__version += 1
+            self.__evict()
+            return None if transaction_id in self.__transactions else REJECT_POOL_FULL
+
+    def __evict(self):
+        while self.__order and (
+            len(self.__transactions) > self.__max_transactions or self.__size > self.__max_bytes
+        ):
+            self.remove(self.__order[-1][-1])
+            self.__evicted += 1
+
+    """
+    Remove transaction with given id, return removed transaction or None
+    """
+    def remove(self, transaction_id):
+        with self.__lock:
+            transaction = self.__transactions.pop(transaction_id, None)
+            if transaction is None:
+                return None
+            key = self.__keys.pop(transaction_id)
+            del self.__tip_hashes[transaction_id]
+            del self.__order[bisect_left(self.__order, key)]
+            for outpoint in Mempool.get_outpoints(transaction):
+                if self.__spent_inputs.get(outpoint) == transaction_id:
+                    del self.__spent_inputs[outpoint]
+            self.__size -= self.__get_size(transaction)
+            self.__version += 1
+            return transaction
+
+    """
+    Remove transactions of a block and pool transactions spending the same inputs,
+    cost depends only on block size
+    """
+    def remove_transactions(self, transactions):
+        with self.__lock:
+            for transaction in transactions:
+                self.remove(transaction.get_id())
+                for outpoint in Mempool.get_outpoints(transaction):
+                    conflicting_id = self.__spent_inputs.get(outpoint)
+                    if conflicting_id is not None:
+                        self.remove(conflicting_id)
+
+    """
+    Remember the tip transactions in the pool were checked on
+    """
+    def set_tip_hash(self, transactions, tip_hash):
+        with self.__lock:
+            for transaction in transactions:
+                if transaction.get_id() in self.__tip_hashes:
+                    self.__tip_hashes[transaction.get_id()] = tip_hash
+
+    """
+    Return transactions which were not checked on any of given tips
+    """
+    def get_transactions_checked_outside(self, tip_hashes):
+        with self.__lock:
+            return [
+                self.__transactions[transaction_id] for transaction_id, tip_hash in self.__tip_hashes.items()
+                if tip_hash is None or tip_hash not in tip_hashes
+            ]
+
+    """
+    Return number which changes whenever content of the pool changes
+    """
+    def get_version(self):
+        return self.__version
+
+    def contains(self, transaction_id):
+        return transaction_id in self.__transactions
+
+    def get(self, transaction_id):
+        return self.__transactions.get(transaction_id)
+
+    """
+    Return id of pool transaction spending given outpoint or None
+    """
+    def get_spending_transaction_id(self, outpoint):
+        return self.__spent_inputs.get(outpoint)
+
+    """
+    Return up to limit transactions with the highest fee rate first
+    """
+    def get_transactions_by_fee_rate(self, limit=None):
+        with self.__lock:
+            keys = self.__order if limit is None else self.__order[:limit]
+            return [self.__transactions[key[-1]] for key in keys]
+
+    def get_stats(self):
+        with self.__lock:
+            return {
+                'transactions': len(self.__transactions),
+                'bytes': self.__size,
+                'max_transactions': self.__max_transactions,
+                'max_bytes': self.__max_bytes,
+                'evicted': self.__evicted
+            }
+
+    def __len__(self):
+        return len(self.__transactions)
@@ -1,6 +1,5 @@
 import base64, json
 from decimal import Decimal
-from requests import post
 from os import environ
 import base64, json
 from flask import jsonify
@@ -14,9 +13,10 @@ from model.transaction_tuples import OutputTuple
 DEFAULT_INTERVAL = 5
 FEE = 0.002
 class MessageGenerator():
-    def __init__(self, log, key_manager, wallet, probability):
+    def __init__(self, log, key_manager, wallet, probability, gossip):
         self.__generator_thread = None
         self.__log = log
+        self.__gossip = gossip
         self.__key_manager = key_manager 
         self.__wallet = wallet  
         self.__generator_active = False
@@ -71,7 +71,7 @@ class MessageGenerator():
 
     """ 
     Broadcast ganerated transaction to others
-    Call method to make requests
+    Transaction is added to own transaction pool and its id is announced to other nodes
     """
     def __broadcast_transaction(self, transaction):
         if self.__should_broadcast() is False:
@@ -80,36 +80,11 @@ class MessageGenerator():
 
         body = transaction.to_dict(True) 
 
-        result, ip = self.__requests_transaction_broadcast(body)
-        if not result:
-            self.__log.error(f"Error broadcasting transaction to {ip} - empty result")
-        else:
-            self.__log.info(f"Successfully broadcasted transaction")
-
-    """
-    In foreach loop, calling method to make request to every ip that is in pub_key_list
-    """
-    def __requests_transaction_broadcast(self, request_data):
-        self.__log.info(f"Starting process for broadcasting transaction")
-
-        for el in self.__key_manager.get_pub_key_list()['entries']:
-            res = self.__request_transaction_broadcast(el['ip'], request_data)
-            if not res:
-                return False, el['ip']
-        return True, None
-
-    """
-    Make request to endpoint /update-transaction-pool for concrete node,
-    with transaction as a body
-    """
-    def __request_transaction_broadcast(self, ip, request_data):
-        self.__log.info(f"Requesting transaction broadcast for ip {ip}")
         try:
-            res = post(self.__key_manager.format_ip(ip, '/update-transaction-pool'), json = request_data)
-            return True if res.ok else False
+            self.__gossip.publish_transaction(body)
+            self.__log.info(f"Successfully broadcasted transaction")
         except Exception as e:
-            self.__log.error(f"Transaction broadcast for ip {ip} failed, reason: {e}")
-            return False
+            self.__log.error(f"Error broadcasting transaction, reason: {e}")
 
     """
     Check balance of the account
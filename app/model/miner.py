@@ -1,17 +1,52 @@
 from logging import Logger
-from multiprocessing import Process, Queue
-from threading import Thread
+from multiprocessing import Array, Pipe, Process, Queue, Value
+from threading import Condition, Lock, RLock, Thread
 from random import randint
 from time import time
-from requests import post
 from model.transaction import Transaction
 from model.transaction_tuples import OutputTuple
 from model.wallet import Wallet
 from model.block import Block
+from model.block_template import BlockTemplate
+from model.header_midstate import HeaderMidstate
 from model.blockchain import Blockchain
 from model.key_manager import KeyManager
+from model.mempool import (
+    Mempool,
+    REJECT_COINBASE,
+    REJECT_NO_INPUTS,
+    REJECT_ALREADY_MINED,
+    REJECT_FOREIGN_INPUT,
+    REJECT_MISSING_INPUT,
+    REJECT_INPUT_AMOUNT,
+    REJECT_AMOUNT_MISMATCH,
+    REJECT_INVALID_SIGNATURE
+)
+from model.signature_verifier import SignatureVerifier
+from model.peer_client import PeerClient
+from model.template_builder import TemplateBuilder
+from model.gossip import INV_BLOCK
 from random import uniform
 
+# number of nonces checked by a worker between cancellation checks
+CANCEL_CHECK_INTERVAL = 4096
+
+# kinds of messages passed through the miner result queue
+MINER_CANDIDATE = 'candidate'
+MINER_EXHAUSTED = 'exhausted'
+MINER_INTERRUPTED = 'interrupted'
+
+# kinds of messages sent to long-lived mining workers through their pipes
+WORKER_JOB = 'job'
+WORKER_IDLE = 'idle'
+WORKER_EXIT = 'exit'
+
+# size caps of transaction pool, transactions with the lowest fee rate are evicted
+MEMPOOL_MAX_TRANSACTIONS = 5000
+MEMPOOL_MAX_BYTES = 5 * 1024 * 1024
+# including coinbase transaction
+MAX_BLOCK_TRANSACTIONS = 1000
+
 class Miner:
     def __init__(
         self,
@@ -21,14 +56,49 @@ class Miner:
         key_manager: KeyManager,
         wallet: Wallet,
         worker_income: int,
-        probability_of_candidate_broadcast: float
+        probability_of_candidate_broadcast: float,
+        worker_count: int = 1,
+        signature_verifier: SignatureVerifier = None,
+        peer_client: PeerClient = None
     ):
         self.__log = log
-        self.__transaction_pool = []
+        self.__mempool = Mempool(MEMPOOL_MAX_TRANSACTIONS, MEMPOOL_MAX_BYTES)
+        # reason code -> number of rejected transactions
+        self.__rejected_transactions = {}
+        # transactions are admitted from concurrent request threads
+        self.__rejected_lock = Lock()
         self.__blockchain = blockchain
         self.__key_manager = key_manager
+        self.__signature_verifier = signature_verifier or SignatureVerifier(1)
+        self.__peer_client = peer_client or PeerClient(log)
+        self.__gossip = None
         self.__max_nonce = 2 ** 32  # 4 billion
-        self.__miner_process = None
+        self.__miner_processes = []
+        # sending ends of worker pipes
+        self.__worker_connections = []
+        self.__miner_run_id = 0
+        # run id of the current job, read by workers to count stale work
+        self.__miner_current_run = Value('i', 0)
+        self.__miner_active = False
+        self.__miner_template = None
+        self.__miner_lock = RLock()
+        # notified on every transaction pool or miner state change
+        self.__pool_condition = Condition()
+        self.__miner_metrics = {
+            'wait_for_work': 0.0,
+            'wait_for_result': 0.0,
+            'work': 0.0,
+            'runs': 0,
+            'candidates': 0,
+            'interrupts': 0
+        }
+        self.__worker_count = max(1, worker_count)
+        self.__miner_winner = -1
+        # hashes of the current job and hashes done after the job became outdated
+        self.__worker_hashes = Array('Q', self.__worker_count)
+        self.__worker_stale_hashes = Array('Q', self.__worker_count)
+        self.__mining_start = None
+        self.__mining_report = {}
         self.__miner_paused = True
         self.__difficulty_bits = difficulty_bits
         self.__miner_result_queue = Queue()
@@ -37,6 +107,13 @@ class Miner:
         self.__wallet = wallet
         self.__worker_income = worker_income
         self.__probability_of_candidate_broadcast = probability_of_candidate_broadcast
+        self.__template_builder = TemplateBuilder(
+            blockchain,
+            self.__mempool,
+            MAX_BLOCK_TRANSACTIONS - 1,
+            self.__revalidate_transactions,
+            self.__create_coinbase_transaction
+        )
 
     def append_transaction(
         self,
@@ -47,67 +124,98 @@ class Miner:
             transaction = Transaction.from_dict_to_transaction(
                 transaction_dict
             )
-            self.__transaction_pool.append(transaction)
-            self.__log.info('Transaction appended successfuly')
         except Exception as e:
             self.__log.error(f'Error appending transaction: {e}')
+            raise Exception(f'Invalid transaction: {e}')
+        reason = self.__admit_transaction(transaction)
+        if reason is not None:
+            raise Exception(f'Transaction {transaction.get_id()} rejected: {reason}')
+        self.__log.info('Transaction appended successfuly')
         return "Transaction appended"
 
+    '''
+    Validate transaction against the best chain state and add it to the pool,
+    return None or reason code of rejection
+    '''
+    def __admit_transaction(self, transaction: Transaction):
+        reason = self.__check_transaction(transaction, set())
+        if reason is None and not self.__check_transaction_signatures([transaction])[0]:
+            reason = REJECT_INVALID_SIGNATURE
+        if reason is None:
+            # chain may have moved since the check, so inputs are checked again atomically with insertion,
+            # the transaction is tagged with the tip it was checked on
+            utxo_set = self.__blockchain.get_utxo_set()
+            with self.__pool_condition:
+                tip = utxo_set.get_tip()
+                reason = self.__check_inputs(transaction, set())
+                if reason is None:
+                    reason = self.__mempool.add(transaction, tip[1] if tip == utxo_set.get_tip() else None)
+                self.__pool_condition.notify_all()
+        if reason is not None:
+            self.__log.info(f'Transaction {transaction.get_id()} rejected: {reason}')
+            with self.__rejected_lock:
+                self.__rejected_transactions[reason] = self.__rejected_transactions.get(reason, 0) + 1
+        return reason
+
+    '''
+    Validate received candidate and add it to blockchain or orphan list,
+    return the block if it was valid or None
+    '''
     def verify_and_save_candidate(self, candidate_dict):
         block_valid, is_orphan, block = self.__blockchain.check_block(candidate_dict)
+        if block_valid and not self.__check_block_signatures(block):
+            self.__log.error(f"Candidate {block.get_hash()} contains transaction with invalid signature")
+            block_valid = False
         if block_valid:
             self.__remove_just_added_transactions(block_dict=candidate_dict)
             new_transactions = self.__handle_new_candidate_request(is_orphan, block)
-            self.__transaction_pool = new_transactions + self.__transaction_pool
+            for transaction in new_transactions:
+                self.__admit_transaction(transaction)
             self.reset_miner_after_new_candidate_request(is_orphan)
+            return block
+        return None
+
+    '''
+    Check if transaction is in the pool or on the best chain
+    '''
+    def has_transaction(self, transaction_id):
+        return self.__mempool.contains(transaction_id) or \
+            self.__blockchain.transaction_exists(transaction_id)
 
+    '''
+    Return transaction from the pool or from the best chain or None
+    '''
+    def get_transaction(self, transaction_id):
+        transaction = self.__mempool.get(transaction_id)
+        if transaction is None:
+            result = self.__blockchain.get_transaction(transaction_id)
+            if result is not None:
+                transaction = result[2]
+        return transaction
+
+    '''
+    Set relay used to announce mined blocks
+    '''
+    def set_gossip(self, gossip):
+        self.__gossip = gossip
+
+    '''
+    Add block to blockchain or orphan list,
+    return transactions of blocks disconnected by switching best chain
+    '''
     def __handle_new_candidate_request(self, is_orphan, block):
-        transactions = []
         if is_orphan:
             self.__blockchain.add_to_orphan_list(block)
-        else:
-            previous_longest_head = self.__blockchain.get_blockchain_head()
-            new_heads = self.__blockchain.add_block(block)
-            new_longest_head = self.__blockchain.get_blockchain_head()
-            # check if one of new branches became the main branches
-            # if yes, remove it from list of heads for transactions extraction
-            # also add previous longest branch to list - we need to extract all current valid transactions
-            if new_longest_head.get_hash() != previous_longest_head.get_hash():
-                self.__log.debug(f"Blockchain master branch has been dethroned")
-                new_heads.remove(new_longest_head)
-                if self.__check_if_appended_to_previous_longest_head(previous_longest_head, new_longest_head) is False:
-                    new_heads.append(previous_longest_head)
-            transactions = self.__filter_transaction(new_longest_head, new_heads, block)
-        return transactions
-
-    def __check_if_appended_to_previous_longest_head(self, previous_head, head):
-        while head is not None:
-            if head.get_hash() == previous_head.get_hash():
-                return True
-            head = head.get_previous_block()
-        return False
-
-    def __extract_transactions(self, head, parent=None):
-        transactions = []
-        processed_block = head
-        while processed_block is not None:
-            current_block_transactions = []
-            if parent is not None and processed_block.get_hash() == parent.get_hash():
-                break
-            for t in processed_block.get_data().get_transactions():
-                if t.is_coinbase() is False or parent is None:
-                    current_block_transactions.append(t)
-            transactions = current_block_transactions + transactions
-            processed_block = processed_block.get_previous_block()
-        return transactions
-
-    def __filter_transaction(self, main_head, new_heads, block):
-        transactions = []
-        for head in new_heads:
-            head_transactions = self.__extract_transactions(block, head)
-            transactions = [t for t in head_transactions if t not in transactions] + transactions
-        main_transactions = self.__extract_transactions(main_head)
-        return [t for t in transactions if t not in main_transactions]
+            return []
+        self.__blockchain.add_block(block)
+        return self.__blockchain.pop_detached_transactions()
+
+    '''
+    Return transactions of blocks disconnected by blocks added outside of miner back to the pool
+    '''
+    def restore_detached_transactions(self):
+        for transaction in self.__blockchain.pop_detached_transactions():
+            self.__admit_transaction(transaction)
 
     '''
     Remove transaction from transaction pool which are
@@ -122,7 +230,8 @@ class Miner:
     Filtration transaction pool - removing from transaction pool transactions that are in new block
     '''
     def __filter_transaction_pool(self, transactions):
-        self.__transaction_pool = [transaction for transaction in self.__transaction_pool if not transaction in transactions]
+        with self.__pool_condition:
+            self.__mempool.remove_transactions(transactions)
 
     '''
     Update head block after new candidate gets appended
@@ -141,16 +250,22 @@ class Miner:
     '''
     def start_miner(self):
         self.__log.info("Starting miner thread")
-        self.__miner_paused = False
-        self.__miner_thread_running = True
+        with self.__pool_condition:
+            self.__miner_paused = False
+            self.__miner_thread_running = True
+            self.__pool_condition.notify_all()
         self.__miner_thread = Thread(target=self.__start_mining)
         self.__miner_thread.start()
         return "Miner sucessfully started"
 
     def stop_miner(self):
+        with self.__pool_condition:
+            self.__miner_thread_running = False
+            self.__pool_condition.notify_all()
         self.__stop_miner_process()
-        self.__miner_thread_running = False
-        self.__miner_thread.join()
+        if self.__miner_thread is not None:
+            self.__miner_thread.join()
+        self.__shutdown_miner_processes()
 
     def __should_accept(self):
         return uniform(0, 1) <= self.__probability_of_candidate_broadcast
@@ -163,52 +278,173 @@ class Miner:
             self.__log.debug("Skipping broadcast of new candidate block")
             return
         self.__log.debug("Broadcasting new candidate block")
-        for el in self.__key_manager.get_pub_key_list()['entries']:
-
-            if el['ip'] != self.__key_manager.get_own_ip():
-                try:
-                    self.__log.debug(f"Sending candidate to {el['ip']}")
-                    res = post(
-                        self.__key_manager.format_ip(
-                            el['ip'], '/save-candidate'
-                        ),
-                        json=candidate.to_dict()
-                    )
-                    if not res.ok:
-                        self.__log.error(
-                            f"Error sending candidate to node {el['ip']}"
-                            f"error: {res.content}"
-                        )
-                except Exception as e:
-                    self.__log.error(
-                        f"Error sending candidate to node {el['ip']}, "
-                        f"error: {e}"
-                    )
+        if self.__gossip is not None:
+            self.__gossip.announce([(INV_BLOCK, candidate.get_hash())])
+            self.__log.debug("New candidate announced")
+            return
+        ips = [
+            el['ip'] for el in self.__key_manager.get_pub_key_list()['entries']
+            if el['ip'] != self.__key_manager.get_own_ip()
+        ]
+        responses = self.__peer_client.broadcast(ips, '/save-candidate', candidate.to_dict())
+        for ip, res in responses.items():
+            if res is not None and not res.ok:
+                self.__log.error(
+                    f"Error sending candidate to node {ip}, "
+                    f"error: {res.content}"
+                )
         self.__log.debug("New candidate broadcast finished")
 
     '''
-    Stop the miner process
+    Stop the current mining job
+    Workers are told to go idle and stay alive for the next job,
+    the current run id is cleared first, so hashing done until workers notice counts as stale
     '''
     def __stop_miner_process(self):
         self.__log.debug("Stopping miner process")
-        self.__miner_paused = True
-        if self.__miner_process is not None and \
-           self.__miner_process.is_alive():
-            self.__miner_process.terminate()
+        with self.__pool_condition:
+            self.__miner_paused = True
+        with self.__miner_lock:
+            if not self.__miner_active:
+                return
+            self.__miner_current_run.value = 0
+            for worker_id in range(len(self.__worker_connections)):
+                self.__send_to_worker(worker_id, (WORKER_IDLE, None))
+            self.__miner_active = False
+            self.__update_mining_report()
+            # wake up control thread waiting for the result of stopped run
+            self.__miner_result_queue.put(
+                (self.__miner_run_id, MINER_INTERRUPTED, None)
+            )
 
     '''
-    Start the miner process
-    Should be started on miner activation through adequate endpoint
+    Start worker processes which are not running yet,
+    workers live until the miner thread is stopped
     '''
-    def __start_miner_process(self):
+    def __start_miner_processes(self):
+        if len(self.__miner_processes) == self.__worker_count and \
+                all(process.is_alive() for process in self.__miner_processes):
+            return
+        self.__shutdown_miner_processes()
         self.__log.debug(
-            "Starting miner process"
+            f"Starting {self.__worker_count} miner process(es)"
         )
-        self.__miner_process = Process(
-            target=self.__proof_of_work
+        for worker_id in range(self.__worker_count):
+            receiver, sender = Pipe(duplex=False)
+            process = Process(
+                target=self.__mining_worker,
+                args=(worker_id, receiver),
+                daemon=True
+            )
+            process.start()
+            receiver.close()
+            self.__miner_processes.append(process)
+            self.__worker_connections.append(sender)
+
+    '''
+    Send message to worker, a worker whose pipe is broken is terminated,
+    so workers are started again with the next job
+    '''
+    def __send_to_worker(self, worker_id, message):
+        try:
+            self.__worker_connections[worker_id].send(message)
+        except OSError as e:
+            self.__log.error(f"Miner worker {worker_id} is not reachable, reason: {e}")
+            self.__miner_processes[worker_id].terminate()
+
+    def __shutdown_miner_processes(self):
+        with self.__miner_lock:
+            for connection in self.__worker_connections:
+                try:
+                    connection.send((WORKER_EXIT, None))
+                except OSError:
+                    pass
+            for process in self.__miner_processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+            for connection in self.__worker_connections:
+                connection.close()
+            self.__miner_processes = []
+            self.__worker_connections = []
+
+    '''
+    Start mining job on worker processes
+    Nonce space is split into equal ranges, one range per worker process
+    Should be started on miner activation through adequate endpoint
+    '''
+    def __start_miner_process(self):
+        # held until workers get the job, so a concurrent stop cannot miss them
+        with self.__miner_lock:
+            return self.__start_miner_job()
+
+    def __start_miner_job(self):
+        # Verify transactions
+        transactions = self.__prepare_transactions()
+        self.__log.info(f'Filtered transaction list len: {len(transactions)}')
+        if len(transactions) == 0:
+            self.__log.debug('Filtered transaction list is empty')
+            return None
+
+        template = BlockTemplate(
+            self.__get_current_head_hash(),
+            transactions,
+            self.__blockchain.get_blockchain_head(),
+            self.__difficulty_bits
         )
-        self.__miner_process.start()
-        self.__miner_paused = False
+        self.__start_miner_processes()
+        self.__miner_run_id += 1
+        self.__miner_template = template
+        self.__miner_winner = -1
+        self.__mining_start = time()
+        self.__miner_current_run.value = self.__miner_run_id
+        target = 2 ** (256-self.__difficulty_bits)
+        range_size = self.__max_nonce // self.__worker_count
+        for worker_id in range(len(self.__worker_connections)):
+            start_nonce = worker_id * range_size
+            end_nonce = self.__max_nonce if worker_id == self.__worker_count - 1 \
+                else start_nonce + range_size
+            self.__send_to_worker(worker_id, (WORKER_JOB, (
+                self.__miner_run_id,
+                template.get_header_prefix(),
+                target,
+                start_nonce,
+                end_nonce
+            )))
+        self.__miner_active = True
+        self.__miner_metrics['runs'] += 1
+        return self.__miner_run_id
+
+    '''
+    Collect number of hashes and hash rate of every worker
+    from the last mining run
+    '''
+    def __update_mining_report(self):
+        elapsed = max(time() - self.__mining_start, 1e-9)
+        workers = []
+        for worker_id, hashes in enumerate(self.__worker_hashes):
+            workers.append({
+                'worker': worker_id,
+                'hashes': hashes,
+                'hash_rate': round(hashes / elapsed, 3),
+                'stale_hashes': self.__worker_stale_hashes[worker_id]
+            })
+        self.__mining_report = {
+            'elapsed': round(elapsed, 3),
+            'winner': self.__miner_winner,
+            'workers': workers,
+            'total_hash_rate': round(sum(w['hash_rate'] for w in workers), 3)
+        }
+        self.__log.info(f"Mining report: {self.__mining_report}")
+
+    def get_mining_report(self):
+        return self.__mining_report
+
+    def get_mempool_stats(self):
+        stats = self.__mempool.get_stats()
+        with self.__rejected_lock:
+            stats['rejected'] = dict(self.__rejected_transactions)
+        return stats
 
     '''
     Start miner process
@@ -224,102 +460,151 @@ class Miner:
         if new_block_transactions is not None:
             self.__filter_transaction_pool(new_block_transactions)
 
-        self.__miner_paused = False
+        with self.__pool_condition:
+            self.__miner_paused = False
+            self.__pool_condition.notify_all()
+
+    '''
+    Block until result of given miner run arrives,
+    results of previous runs are dropped
+    The run is exhausted when every worker reports its range exhausted
+    '''
+    def __get_candidate_block(self, run_id):
+        exhausted_workers = 0
+        while True:
+            result_run_id, kind, payload = self.__miner_result_queue.get()
+            if result_run_id != run_id:
+                self.__log.debug(f"Dropping stale result of miner run {result_run_id}")
+                continue
+            if kind == MINER_EXHAUSTED:
+                exhausted_workers += 1
+                if exhausted_workers < self.__worker_count:
+                    continue
+                return kind, None
+            if kind == MINER_CANDIDATE:
+                self.__miner_winner, nonce = payload
+                return kind, self.__miner_template.to_block(nonce)
+            return kind, payload
+
+    def __has_work(self):
+        return not self.__miner_thread_running or \
+            (self.__miner_paused is False and len(self.__mempool) > 0)
 
-    def __get_candidate_block(self) -> Block:
-        return self.__miner_result_queue.get()
+    '''
+    Return time spent by control thread on waiting and on work
+    '''
+    def get_miner_metrics(self):
+        metrics = dict(self.__miner_metrics)
+        metrics['template'] = self.__template_builder.get_stats()
+        metrics['stale_hashes'] = sum(self.__worker_stale_hashes)
+        total = metrics['wait_for_work'] + metrics['wait_for_result'] + metrics['work']
+        metrics['work_ratio'] = round(metrics['work'] / total, 3) if total > 0 else 0.0
+        return metrics
 
     '''
     Thread responsible for the miner process control flow
     This only controls the execution flow of the miner process
+    Sleeps on the pool condition until there is work to do
+    and on the result queue until the started run finishes
     '''
     def __start_mining(self):
-        while self.__miner_thread_running:
-            # Miner currenty paused or has no work to do
-            if self.__miner_paused is True or self.__transaction_pool == []:
+        while True:
+            wait_start = time()
+            with self.__pool_condition:
+                # Miner currenty paused or has no work to do
+                self.__pool_condition.wait_for(self.__has_work)
+                if not self.__miner_thread_running:
+                    break
+            work_start = time()
+            self.__miner_metrics['wait_for_work'] += work_start - wait_start
+
+            run_id = self.__start_miner_process()
+            # Transaction list after filtering is empty, invalid transactions were dropped
+            if run_id is None:
+                self.__reset_miner_process()
+                self.__miner_metrics['work'] += time() - work_start
                 continue
 
-            else:
-                # Miner not running even though its not paused
-                if self.__miner_process is None \
-                        or not self.__miner_process.is_alive():
-                    pending_transactions = self.__transaction_pool 
-                    self.__start_miner_process()
-                    continue
+            wait_start = time()
+            self.__miner_metrics['work'] += wait_start - work_start
+            kind, candidate = self.__get_candidate_block(run_id)
+            work_start = time()
+            self.__miner_metrics['wait_for_result'] += work_start - wait_start
 
-                # Miner found a candidate
-                elif not self.__miner_result_queue.empty():
-                    candidate = self.__get_candidate_block()
+            # Run stopped from outside, miner state was set by the caller
+            if kind == MINER_INTERRUPTED:
+                self.__miner_metrics['interrupts'] += 1
 
-                    # Candidate not found, retry
-                    if candidate is None:
-                        self.__reset_miner_process()
-                        continue
+            # Candidate not found, retry
+            elif kind == MINER_EXHAUSTED:
+                self.__reset_miner_process()
 
-                    # Transaction list after filtering is empty
-                    if candidate is False:
-                        self.__reset_miner_process(pending_transactions)
-                        continue
-
-                    self.__broadcast_candidate(candidate)
-                    self.__blockchain.add_block(candidate)
-                    self.__reset_miner_process(
-                        candidate.get_data().get_transactions()
-                    )
-                    continue
+            # Miner found a candidate
+            else:
+                self.__miner_metrics['candidates'] += 1
+                self.__stop_miner_process()
+                # added first, so peers fetching the announced block can get it
+                self.__blockchain.add_block(candidate)
+                self.__broadcast_candidate(candidate)
+                self.__reset_miner_process(
+                    candidate.get_data().get_transactions()
+                )
+            self.__miner_metrics['work'] += time() - work_start
 
     '''
-    Check if transaction id is unique - go through whole blockchain
+    Check if transaction id is unique - look up transaction index of the best chain
     '''
     def __check_transaction_id(self, transaction: Transaction):
-        current_block = self.__blockchain.get_blockchain_head()
-        while current_block is not None:
-            block_transactions = current_block.get_data().get_transactions()
-            for block_transaction in block_transactions:
-                if block_transaction.get_id() == transaction.get_id():
-                    self.__log.debug("Transaction ID not unique")
-                    return False
-            current_block = current_block.get_previous_block()
+        if self.__blockchain.transaction_exists(transaction.get_id()):
+            self.__log.debug("Transaction ID not unique")
+            return False
         return True
 
     '''
-    Check if inputs are unspent
+    Check if inputs belong to the sender and are unspent outputs of the best chain
+    with matching amounts, outpoints spent by transactions accepted before are given
     '''
-    def __check_inputs_unspent(
+    def __check_inputs(
         self,
         transaction: Transaction,
-        previous_inputs: list
+        spent_outpoints: set
     ):
-        if len(transaction.get_inputs()) == 0:
-            self.__log.debug(f"Error - empty list for transaction "
-                             f"{transaction.get_id()}")
-            return False
-
-        transaction_pub_key = transaction.get_output().get_current_owner()
-        unspent_outputs = self.__wallet.get_unspent_outputs(
-            transaction_pub_key
-        )
-        for input in transaction.get_inputs():
-            if (
-                input.get_previous_id() in
-                    [i.get_previous_id() for i in 
-                     previous_inputs.get(transaction_pub_key, [])]
-            ):
+        sender_pub_key = transaction.get_output().get_current_owner()
+        utxo_set = self.__blockchain.get_utxo_set()
+        for outpoint, input in zip(Mempool.get_outpoints(transaction), transaction.get_inputs()):
+            if input.get_current_owner() != sender_pub_key:
+                return REJECT_FOREIGN_INPUT
+            amount = utxo_set.get_amount(*outpoint)
+            if amount is None or outpoint in spent_outpoints:
                 self.__log.debug(
                     f"Input with id {input.get_previous_id()} "
-                    f"has already been spent in previous mined transactions"
+                    f"is not an unspent output of the best chain"
                 )
-                return False
-            if (
-                input.get_previous_id() not in unspent_outputs.keys()
-            ):
-                self.__log.debug(
-                    f"Input with id {input.get_previous_id()} "
-                    f"has already been spent in previous block "
-                    f"{input.get_amount()}"
-                )
-                return False
-        return True
+                return REJECT_MISSING_INPUT
+            if round(amount, 3) != round(input.get_amount(), 3):
+                return REJECT_INPUT_AMOUNT
+        return None
+
+    '''
+    Check transaction without its signature, return reason code of rejection or None
+    1. Transaction is not a coinbase and has inputs
+    2. Transaction id is unique
+    3. Inputs are unspent outputs of the sender
+    4. Inputs amount matches outputs + fee
+    '''
+    def __check_transaction(self, transaction: Transaction, spent_outpoints: set):
+        if transaction.is_coinbase():
+            return REJECT_COINBASE
+        if len(transaction.get_inputs()) == 0:
+            return REJECT_NO_INPUTS
+        if not self.__check_transaction_id(transaction):
+            return REJECT_ALREADY_MINED
+        reason = self.__check_inputs(transaction, spent_outpoints)
+        if reason is not None:
+            return reason
+        if not self.__check_inputs_value(transaction):
+            return REJECT_AMOUNT_MISMATCH
+        return None
 
     '''
     Check if inputs amount matches outputs + fee
@@ -346,49 +631,62 @@ class Miner:
         return True
 
     '''
-    Check if transaction signature is correct
+    Verify signatures of transactions in one batch,
+    return list of booleans in order of transactions
     '''
-    def __check_transaction_signature(self, transaction: Transaction):
-        sender_pub_key = transaction.get_inputs()[0].get_current_owner()
-        return self.__key_manager.verify_signature(
-            sender_pub_key,
-            transaction.get_signature(),
-            transaction.get_hash()
-        )
+    def __check_transaction_signatures(self, transactions):
+        return self.__signature_verifier.verify_transactions(transactions)
+
+    '''
+    Check if signatures of all block transactions are correct
+    '''
+    def __check_block_signatures(self, block: Block):
+        return all(self.__check_transaction_signatures(
+            block.get_data().get_transactions()
+        ))
 
     '''
     Verify transactions processed by the miner
-    1. Check if transaction id is unique
-    2. Check if inputs are unspent
-    3. Check if inputs cover outputs + fee
-    4. Verify signatures
-    5. Verify if there are no issues with amount mismatch output/input
+    Pool transactions were admitted on an older chain state,
+    so they are checked again in fee rate order, then their signatures in one parallel batch
     '''
     def __get_valid_transactions(self, pending_transactions):
-        valid_transactions = []
-        previous_inputs = {}
+        checked_transactions = []
+        spent_outpoints = set()
         for transaction in pending_transactions:
-            sender_pub_key = transaction.get_output().get_current_owner()
-            if (
-                self.__check_transaction_id(transaction) and
-                self.__check_inputs_unspent(transaction, previous_inputs) and
-                self.__check_inputs_value(transaction) and
-                self.__check_transaction_signature(transaction)
-            ):
-                for input in transaction.get_inputs():
-                    if sender_pub_key not in previous_inputs.keys():
-                        previous_inputs[sender_pub_key] = []
-                    previous_inputs[sender_pub_key].append(input)
-                valid_transactions.append(transaction)
-            else:
-                pending_transactions.remove(transaction)
+            reason = self.__check_transaction(transaction, spent_outpoints)
+            if reason is not None:
+                self.__log.debug(f"Transaction {transaction.get_id()} no longer valid: {reason}")
+                continue
+            spent_outpoints.update(Mempool.get_outpoints(transaction))
+            checked_transactions.append(transaction)
+        signatures = self.__check_transaction_signatures(checked_transactions)
+        return [t for t, signature_valid in zip(checked_transactions, signatures) if signature_valid]
+
+    '''
+    Remove transactions which can not be mined on current best chain from the pool
+    '''
+    def __drop_invalid_transactions(self, pending_transactions, valid_transactions):
+        valid_ids = {t.get_id() for t in valid_transactions}
+        with self.__pool_condition:
+            for transaction in pending_transactions:
+                if transaction.get_id() not in valid_ids:
+                    self.__mempool.remove(transaction.get_id())
+
+    '''
+    Validate pool transactions on the current best chain again,
+    invalid ones are removed from the pool
+    '''
+    def __revalidate_transactions(self, pending_transactions):
+        utxo_set = self.__blockchain.get_utxo_set()
+        tip = utxo_set.get_tip()
+        valid_transactions = self.__get_valid_transactions(pending_transactions)
+        self.__drop_invalid_transactions(pending_transactions, valid_transactions)
+        self.__mempool.set_tip_hash(valid_transactions, tip[1] if tip == utxo_set.get_tip() else None)
         return valid_transactions
 
-    def __create_coinbase_transaction(self, valid_transactions):
-        total_amount = self.__worker_income
-        for transaction in valid_transactions:
-            total_amount += transaction.get_fee()
-        total_amount = round(total_amount, 3)
+    def __create_coinbase_transaction(self, fees):
+        total_amount = round(self.__worker_income + fees, 3)
         return self.__wallet.makeup_transaction(
             is_coinbase=True,
             output=OutputTuple(
@@ -402,17 +700,9 @@ class Miner:
 
     def __prepare_transactions(self):
         start = time()
-        pending_transactions = self.__transaction_pool
-        valid_transactions = self.__get_valid_transactions(
-            pending_transactions
-        )
-        if len(valid_transactions) > 0:
-            valid_transactions.append(
-                self.__create_coinbase_transaction(
-                    valid_transactions
-                )
-            )
-        diff = start - time()
+        # highest fee rate first, block is filled up to MAX_BLOCK_TRANSACTIONS
+        valid_transactions = self.__template_builder.get_transactions()
+        diff = time() - start
         self.__log.info(
             f'Transactions filtered in {diff}s, '
             f'lenght: {len(valid_transactions)}'
@@ -420,46 +710,48 @@ class Miner:
         return valid_transactions
 
     '''
-    Calculate proof of work
-    Return found Candidate
+    Long-lived mining worker
+    Waits for a job on its pipe and calculates proof of work over the nonce range of the job,
+    between batches of nonces the pipe is checked, so a new job replaces the current one mid-scan
+    Found nonce is put to the result queue, the block is created by the control thread
     '''
-    def __proof_of_work(
-        self
-    ):
-        # Verify transactions
-        transactions = self.__prepare_transactions()
-        self.__log.info(f'Filtered transaction list len: {len(transactions)}')
-        # calculate the difficulty target
-        target = 2 ** (256-self.__difficulty_bits)
-
-        if len(transactions) == 0:
-            self.__log.debug('Filtered transaction list is empty')
-            self.__miner_result_queue.put(False)
-            return
-
-        start = time()
-        for nonce in range(0, self.__max_nonce):
-            candidate_block = Block(
-                self.__get_current_head_hash(),
-                nonce,
-                transactions,
-                self.__blockchain.get_blockchain_head()
-            )
-            hash_result = candidate_block.get_hash()
-
-            # check if this is a valid result, below the target
-            if int(hash_result, 16) < target:
-                end = time() - start
-                self.__log.debug(f"Success with nonce {nonce} in time {end}s")
-                self.__log.debug(f'Hash is {hash_result}')
-                self.__log.debug(
-                    f"Hash previous: {self.__get_current_head_hash()}"
-                )
-                self.__miner_result_queue.put(candidate_block)
-                return
+    def __mining_worker(self, worker_id, connection):
+        job = None
+        while True:
+            if job is None or connection.poll():
+                kind, job = connection.recv()
+                if kind == WORKER_EXIT:
+                    return
+                if job is not None:
+                    run_id, header_prefix, target, nonce, end_nonce = job
+                    midstate = HeaderMidstate(header_prefix)
+                    start = time()
+                    self.__worker_hashes[worker_id] = 0
+                continue
 
-        self.__log.error(f'Failed after {nonce} tries')
-        self.__miner_result_queue.put(None)
+            batch_end = min(nonce + CANCEL_CHECK_INTERVAL, end_nonce)
+            for candidate_nonce in range(nonce, batch_end):
+                # check if this is a valid result, below the target
+                if midstate.hash_nonce(candidate_nonce) < target:
+                    batch_end = candidate_nonce + 1
+                    self.__log.debug(
+                        f"Worker {worker_id} success with nonce {candidate_nonce} in time {time() - start}s"
+                    )
+                    self.__miner_result_queue.put(
+                        (run_id, MINER_CANDIDATE, (worker_id, candidate_nonce))
+                    )
+                    job = None
+                    break
+            self.__worker_hashes[worker_id] += batch_end - nonce
+            # job was replaced or stopped while this batch was hashed
+            if self.__miner_current_run.value != run_id:
+                self.__worker_stale_hashes[worker_id] += batch_end - nonce
+            nonce = batch_end
+
+            if job is not None and nonce == end_nonce:
+                self.__log.error(f'Worker {worker_id} failed after {self.__worker_hashes[worker_id]} tries')
+                self.__miner_result_queue.put((run_id, MINER_EXHAUSTED, worker_id))
+                job = None
 
     def __get_current_head_hash(self):
         return self.__blockchain.get_blockchain_head().get_hash()
@@ -474,19 +766,19 @@ class Miner:
         start_point = randint(0, self.__max_nonce)
         end_point = start_point + self.__max_nonce
 
+        template = BlockTemplate(
+            None,
+            transactions,
+            self.__blockchain.get_blockchain_head(),
+            self.__difficulty_bits
+        )
         for nonce in range(start_point, end_point):
-            candidate_block = Block(
-                None,
-                nonce,
-                transactions,
-                self.__blockchain.get_blockchain_head()
-            )
-            hash_result = candidate_block.get_hash()
-
+            # nonce is a 32 bit header field
+            nonce %= self.__max_nonce
             # check if this is a valid result, below the target
-            if int(hash_result, 16) < target:
+            if template.hash_nonce(nonce) < target:
                 self.__log.debug(f"Success with nonce {nonce}")
-                return candidate_block
+                return template.to_block(nonce)
 
         self.__log.error(f'Failed after {nonce} tries')
-        self.__miner_result_queue.put(None)
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -6,7 +6,13 @@ from model.key_manager import KeyManager
 from model.message_generator import MessageGenerator
 from model.blockchain import Blockchain
 from model.miner import Miner
+from model.signature_verifier import SignatureVerifier
+from model.peer_client import PeerClient
+from model.gossip import Gossip
+from model.chain_sync import ChainSync, HEADERS_BATCH
+from model.key_registry import KeyRegistry
 import json
+import os
 
 OK = 200
 ERROR = 400
@@ -16,15 +22,25 @@ DIFFICULTY_BITS = 17
 MINER_REWARD = 0.005
 PROBABILITY_OF_TRANSACTION_BROADCAST = 0.8
 PROBABILITY_OF_CANDIDATE_BROADCAST = 0.8
+MINER_WORKERS = int(os.environ.get('MINER_WORKERS', os.cpu_count() or 1))
+# keep only block headers in memory and page transactions in from block log
+LAZY_BLOCKS = os.environ.get('LAZY_BLOCKS', '0') == '1'
+VERIFIER_WORKERS = int(os.environ.get('VERIFIER_WORKERS', os.cpu_count() or 1))
 IP_PREFIX = '172.16.238.10'
 
 class Node:
     def __init__(self, secret, files_path, log):
-        self.__key_manager = KeyManager(secret, files_path, log)
-        self.__blockchain = Blockchain(files_path, log, DIFFICULTY_BITS)
+        self.__peer_client = PeerClient(log)
+        self.__key_manager = KeyManager(secret, files_path, log, self.__peer_client)
+        self.__key_registry = KeyRegistry()
+        self.__blockchain = Blockchain(files_path, log, DIFFICULTY_BITS, LAZY_BLOCKS, self.__key_registry)
         self.__wallet = Wallet(self.__key_manager, self.__blockchain, log)
-        self.__message_generator = MessageGenerator(log, self.__key_manager, self.__wallet, PROBABILITY_OF_TRANSACTION_BROADCAST)
-        self.__miner = Miner(log, DIFFICULTY_BITS, self.__blockchain, self.__key_manager, self.__wallet, MINER_REWARD, PROBABILITY_OF_CANDIDATE_BROADCAST)
+        self.__signature_verifier = SignatureVerifier(VERIFIER_WORKERS)
+        self.__miner = Miner(log, DIFFICULTY_BITS, self.__blockchain, self.__key_manager, self.__wallet, MINER_REWARD, PROBABILITY_OF_CANDIDATE_BROADCAST, MINER_WORKERS, self.__signature_verifier, self.__peer_client)
+        self.__gossip = Gossip(log, self.__key_manager, self.__peer_client, self.__blockchain, self.__miner, self.__key_registry)
+        self.__miner.set_gossip(self.__gossip)
+        self.__chain_sync = ChainSync(log, self.__key_manager, self.__peer_client, self.__blockchain, self.__signature_verifier, self.__miner, self.__gossip)
+        self.__message_generator = MessageGenerator(log, self.__key_manager, self.__wallet, PROBABILITY_OF_TRANSACTION_BROADCAST, self.__gossip)
         self.__current_candidate = None
         self.__log = log
 
@@ -33,7 +49,10 @@ class Node:
 
     def connect(self, request_data):
         try:
-            return self.__key_manager.connect(request_data), OK
+            response = self.__key_manager.connect(request_data)
+            # joined network knows nothing about this node's chain, download it
+            self.__chain_sync.start()
+            return response, OK
         except Exception as e:
             return str(e), ERROR
 
@@ -115,6 +134,66 @@ class Node:
         self.__miner.stop_miner()
         return "Miner paused", OK
 
+    def get_mining_report(self):
+        return json.dumps(self.__miner.get_mining_report()), OK
+
+    def get_miner_metrics(self):
+        return json.dumps(self.__miner.get_miner_metrics()), OK
+
+    def get_mempool_stats(self):
+        return json.dumps(self.__miner.get_mempool_stats()), OK
+
+    def get_verifying_key_cache_stats(self):
+        return json.dumps(self.__key_manager.get_verifying_key_cache_stats()), OK
+
+    def get_signature_verifier_stats(self):
+        return json.dumps(self.__signature_verifier.get_stats()), OK
+
+    def get_peer_stats(self):
+        return json.dumps(self.__peer_client.get_stats()), OK
+
+    def handle_inv(self, request_data):
+        try:
+            return self.__gossip.handle_inv(request_data), OK
+        except Exception as e:
+            return str(e), ERROR
+
+    def get_data(self, request_data):
+        try:
+            return json.dumps(self.__gossip.get_data(request_data)), OK
+        except Exception as e:
+            return str(e), ERROR
+
+    def get_keys(self, request_data):
+        try:
+            return json.dumps(self.__gossip.get_keys(request_data)), OK
+        except Exception as e:
+            return str(e), ERROR
+
+    def get_gossip_stats(self):
+        return json.dumps(self.__gossip.get_stats()), OK
+
+    def get_orphan_pool_stats(self):
+        return json.dumps(self.__blockchain.get_orphan_pool_stats()), OK
+
+    def get_reorg_stats(self):
+        return json.dumps(self.__blockchain.get_reorg_stats()), OK
+
+    def get_headers(self, request_data):
+        try:
+            limit = min(int(request_data.get('limit', HEADERS_BATCH)), HEADERS_BATCH)
+            return json.dumps(self.__blockchain.get_headers(request_data['locator'], limit)), OK
+        except Exception as e:
+            return str(e), ERROR
+
+    def start_sync(self):
+        if self.__chain_sync.start():
+            return "Chain synchronization started", OK
+        return "Chain synchronization is already running", ERROR
+
+    def get_sync_status(self):
+        return json.dumps(self.__chain_sync.get_status()), OK
+
     def get_current_balance(self, id):
         pub_key = self.__key_manager.get_pub_key_for_ip(IP_PREFIX + id)
         if pub_key is None:
@@ -126,6 +205,17 @@ class Node:
     def __verify_and_save_candidate(self):
         self.__miner.verify_and_save_candidate(self.__current_candidate)
 
+    def get_transaction(self, id):
+        result = self.__blockchain.get_transaction(id)
+        if result is None:
+            return f"Transaction {id} not found", ERROR
+        block_hash, position, transaction = result
+        return json.dumps({
+            'block_hash': block_hash,
+            'position': position,
+            'transaction': transaction.to_dict(True)
+        }), OK
+
     def get_block_count(self):
         count = self.__blockchain.get_block_count()
         return count, OK
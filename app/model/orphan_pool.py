@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+class OrphanPool:
+    """
+    Blocks whose parent is not known yet keyed by hash and by hash of the missing parent
+    When the parent arrives its children are taken out in one lookup,
+    the oldest orphans are evicted after max_age seconds or when there are more than max_blocks
+    """
+    def __init__(self, max_blocks, max_age):
+        self.__max_blocks = max_blocks
+        self.__max_age = max_age
+        self.__lock = Lock()
+        # block hash -> (block, arrival time), in order of arrival
+        self.__blocks = OrderedDict()
+        # previous block hash -> {block hash: block}
+        self.__children = {}
+        self.__evicted = 0
+        self.__connected = 0
+
+    def __purge(self, now):
+        while self.__blocks:
+            block_hash, (block, arrival) = next(iter(self.__blocks.items()))
+            if arrival + self.__max_age > now and len(self.__blocks) < self.__max_blocks:
+                break
+            self.__remove(block_hash)
+            self.__evicted += 1
+
+    def __remove(self, block_hash):
+        block, _ = self.__blocks.pop(block_hash)
+        previous_hash = block.get_header().get_previous_block_hash()
+        siblings = self.__children[previous_hash]
+        del siblings[block_hash]
+        if not siblings:
+            del self.__children[previous_hash]
+        return block
+
+    """
+    Add orphan block and link it with its parent and children already in the pool,
+    return False if the block is already there
+    """
+    def add(self, block):
+        with self.__lock:
+            block_hash = block.get_hash()
+            if block_hash in self.__blocks:
+                return False
+            # make room for the new block
+            self.__purge(time())
+            previous_hash = block.get_header().get_previous_block_hash()
+            parent = self.__blocks.get(previous_hash)
+            if parent is not None:
+                block.set_previous_block(parent[0])
+            for child in self.__children.get(block_hash, {}).values():
+                child.set_previous_block(block)
+            self.__blocks[block_hash] = (block, time())
+            self.__children.setdefault(previous_hash, {})[block_hash] = block
+            return True
+
+    """
+    Remove and return orphans which are children of block with given hash
+    """
+    def pop_children(self, block_hash):
+        with self.__lock:
+            children = [self.__remove(child_hash) for child_hash in list(self.__children.get(block_hash, {}))]
+            self.__connected += len(children)
+            return children
+
+    def contains(self, block_hash):
+        return block_hash in self.__blocks
+
+    """
+    Return orphans without children in the pool
+    """
+    def get_heads(self):
+        with self.__lock:
+            return [block for block_hash, (block, _) in self.__blocks.items() if block_hash not in self.__children]
+
+    def get_stats(self):
+        with self.__lock:
+            return {
+                'blocks': len(self.__blocks),
+                'max_blocks': self.__max_blocks,
+                'max_age': self.__max_age,
+                'evicted': self.__evicted,
+                'connected': self.__connected
+            }
+
+    def __len__(self):
+        return len(self.__blocks)
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import time
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeout in seconds of a request to a peer without its own timeout
+DEFAULT_TIMEOUT = (2, 10)
+# keep-alive connections kept per peer
+CONNECTIONS_PER_PEER = 4
+BROADCAST_THREADS = 16
+
+class PeerClient:
+    """
+    HTTP client shared by all components talking to other nodes
+    Connections are kept alive in a session pool, broadcasts are sent
+    to all peers concurrently, so they take as long as the slowest peer
+    Latency and errors are recorded per peer
+    """
+    def __init__(self, log):
+        self.__log = log
+        self.__session = Session()
+        adapter = HTTPAdapter(pool_connections=BROADCAST_THREADS, pool_maxsize=CONNECTIONS_PER_PEER)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+        self.__executor = ThreadPoolExecutor(max_workers=BROADCAST_THREADS, thread_name_prefix='peer')
+        self.__lock = Lock()
+        # ip -> timeout
+        self.__timeouts = {}
+        # ip -> request statistics
+        self.__stats = {}
+
+    """
+    Format URL of endpoint of given node
+    """
+    def format_url(self, ip, endpoint):
+        return f"{ip}/{endpoint.lstrip('/')}"
+
+    def set_timeout(self, ip, timeout):
+        with self.__lock:
+            self.__timeouts[ip] = timeout
+
+    def __record(self, ip, latency, error=None):
+        with self.__lock:
+            stats = self.__stats.setdefault(ip, {
+                'requests': 0,
+                'errors': 0,
+                'total_latency': 0.0,
+                'max_latency': 0.0,
+                'last_error': None
+            })
+            stats['requests'] += 1
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            if error is not None:
+                stats['errors'] += 1
+                stats['last_error'] = error
+
+    """
+    Send request to endpoint of given node and return response,
+    exceptions are recorded in peer statistics and raised
+    """
+    def request(self, method, ip, endpoint, json=None):
+        timeout = self.__timeouts.get(ip, DEFAULT_TIMEOUT)
+        start = time()
+        try:
+            response = self.__session.request(method, self.format_url(ip, endpoint), json=json, timeout=timeout)
+        except Exception as e:
+            self.__record(ip, time() - start, str(e))
+            raise
+        self.__record(ip, time() - start, None if response.ok else f"HTTP {response.status_code}")
+        return response
+
+    def post(self, ip, endpoint, json=None):
+        return self.request('POST', ip, endpoint, json)
+
+    def get(self, ip, endpoint):
+        return self.request('GET', ip, endpoint)
+
+    def __post_quietly(self, ip, endpoint, json):
+        try:
+            return self.post(ip, endpoint, json)
+        except Exception as e:
+            self.__log.error(f"Request to {self.format_url(ip, endpoint)} failed, reason: {e}")
+            return None
+
+    """
+    Post the same body to endpoint of every given node concurrently
+    Return dictionary ip -> response, None for nodes which could not be reached
+    """
+    def broadcast(self, ips, endpoint, json=None):
+        ips = list(ips)
+        responses = self.__executor.map(lambda ip: self.__post_quietly(ip, endpoint, json), ips)
+        return dict(zip(ips, responses))
+
+    def get_stats(self):
+        with self.__lock:
+            stats = {}
+            for ip, peer_stats in self.__stats.items():
+                stats[ip] = dict(peer_stats)
+                stats[ip]['average_latency'] = round(peer_stats['total_latency'] / peer_stats['requests'], 6)
+                stats[ip]['max_latency'] = round(peer_stats['max_latency'], 6)
+                stats[ip]['timeout'] = self.__timeouts.get(ip, DEFAULT_TIMEOUT)
+                del stats[ip]['total_latency']
+            return stats
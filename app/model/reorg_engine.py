@@ -0,0 +1,123 @@
+from threading import Lock
+
+class ReorgEngine:
+    """
+    Moves chain state from one best chain to another
+    Fork point is found walking block index entries of both tips by height,
+    blocks of the old branch are disconnected with undo data kept by unspent output set,
+    so cost depends only on depth of the reorganization
+    Undo data is kept only for the last max_depth blocks, deeper reorganizations are refused
+    Transactions of disconnected blocks which are not on the new branch are kept
+    until they are taken back to the transaction pool
+    """
+    def __init__(self, log, utxo_set, transaction_index, max_depth):
+        self.__log = log
+        self.__max_depth = max_depth
+        self.__utxo_set = utxo_set
+        self.__transaction_index = transaction_index
+        # hashes of blocks of the best chain, position is block height
+        self.__best_chain = []
+        self.__lock = Lock()
+        # transactions of disconnected blocks, oldest first
+        self.__detached_transactions = []
+        self.__stats = {
+            'reorgs': 0,
+            'max_depth': 0,
+            'disconnected': 0,
+            'detached_transactions': 0,
+            'refused': 0
+        }
+
+    """
+    Return (disconnected, connected) entries between old and new best entry,
+    disconnected from the old tip down, connected from the fork point up
+    """
+    def __find_fork(self, old_best, new_best):
+        disconnected = []
+        connected = []
+        while old_best is not new_best:
+            if new_best is None or \
+                    (old_best is not None and old_best.get_height() >= new_best.get_height()):
+                disconnected.append(old_best)
+                old_best = old_best.get_parent()
+            else:
+                connected.append(new_best)
+                new_best = new_best.get_parent()
+        connected.reverse()
+        return disconnected, connected
+
+    """
+    Return True if the best chain can be switched from old to new best entry
+    without disconnecting more than max depth blocks
+    """
+    def can_switch(self, old_best, new_best):
+        disconnected, _ = self.__find_fork(old_best, new_best)
+        return len(disconnected) <= self.__max_depth
+
+    """
+    Disconnect old branch blocks down to the fork point, then connect new branch blocks,
+    return False without changing chain state if the fork point is deeper than max depth
+    """
+    def switch(self, old_best, new_best):
+        disconnected, connected = self.__find_fork(old_best, new_best)
+        if len(disconnected) > self.__max_depth:
+            with self.__lock:
+                self.__stats['refused'] += 1
+            self.__log.error(f"Best chain switch refused, {len(disconnected)} block(s) would be disconnected")
+            return False
+        # checks made while the set is between two tips do not belong to any of them
+        self.__utxo_set.set_tip_hash(None)
+        for entry in disconnected:
+            transactions = entry.get_block().get_data().get_transactions()
+            self.__utxo_set.disconnect_block(entry.get_hash(), transactions)
+            self.__transaction_index.disconnect_block(entry.get_hash(), transactions)
+            self.__best_chain.pop()
+        for entry in connected:
+            transactions = entry.get_block().get_data().get_transactions()
+            self.__utxo_set.connect_block(entry.get_hash(), transactions)
+            self.__transaction_index.connect_block(entry.get_hash(), transactions)
+            self.__best_chain.append(entry.get_hash())
+            if len(self.__best_chain) > self.__max_depth:
+                self.__utxo_set.remove_undo(self.__best_chain[-1 - self.__max_depth])
+        self.__utxo_set.set_tip_hash(new_best.get_hash())
+        if disconnected:
+            # transactions mined again on the new branch are not returned
+            detached = [
+                t for entry in reversed(disconnected) for t in entry.get_block().get_data().get_transactions()
+                if not t.is_coinbase() and not self.__transaction_index.contains(t.get_id())
+            ]
+            with self.__lock:
+                self.__detached_transactions.extend(detached)
+                self.__stats['reorgs'] += 1
+                self.__stats['max_depth'] = max(self.__stats['max_depth'], len(disconnected))
+                self.__stats['disconnected'] += len(disconnected)
+                self.__stats['detached_transactions'] += len(detached)
+            self.__log.info(f"Best chain switched, {len(disconnected)} block(s) disconnected, {len(connected)} connected, {len(detached)} transaction(s) detached")
+        return True
+
+    """
+    Return and forget transactions of disconnected blocks
+    """
+    def pop_detached_transactions(self):
+        with self.__lock:
+            transactions = self.__detached_transactions
+            self.__detached_transactions = []
+            return transactions
+
+    """
+    Set hashes of best chain blocks when chain state is loaded from a snapshot
+    """
+    def set_best_chain(self, hashes):
+        self.__best_chain[:] = hashes
+
+    """
+    Return hashes of best chain blocks indexed by height, the list is owned by the engine
+    """
+    def get_best_chain(self):
+        return self.__best_chain
+
+    def get_stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['height'] = len(self.__best_chain) - 1
+            return stats
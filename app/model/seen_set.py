@@ -0,0 +1,46 @@
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+class SeenSet:
+    """
+    Set of recently seen keys, a key is forgotten after ttl seconds
+    or when the set grows over max_size, the oldest keys go first
+    """
+    def __init__(self, ttl, max_size):
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__lock = Lock()
+        # key -> expiry time, in order of insertion
+        self.__expiry = OrderedDict()
+
+    def __purge(self, now):
+        while self.__expiry:
+            key, expiry = next(iter(self.__expiry.items()))
+            if expiry > now and len(self.__expiry) < self.__max_size:
+                break
+            self.__expiry.popitem(last=False)
+
+    """
+    Add key, return False if it was already seen
+    """
+    def add(self, key):
+        with self.__lock:
+            now = time()
+            self.__purge(now)
+            if key in self.__expiry:
+                return False
+            self.__expiry[key] = now + self.__ttl
+            return True
+
+    def remove(self, key):
+        with self.__lock:
+            self.__expiry.pop(key, None)
+
+    def contains(self, key):
+        with self.__lock:
+            self.__purge(time())
+            return key in self.__expiry
+
+    def __len__(self):
+        return len(self.__expiry)
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from time import time
+from model.verifying_key_cache import VerifyingKeyCache
+import base64
+
+# parsed keys kept by every verifier process
+VERIFIER_KEY_CACHE_SIZE = 128
+# smaller batches are verified in the calling process
+MIN_PARALLEL_BATCH = 4
+
+# verifying key cache of the current process
+process_key_cache = VerifyingKeyCache(VERIFIER_KEY_CACHE_SIZE)
+
+"""
+Verify one (pub key, signature, message) item,
+malformed keys and signatures are reported as invalid
+"""
+def verify_item(item):
+    pub_key, signed_message, message = item
+    if pub_key is None or signed_message is None:
+        return False
+    try:
+        vk = process_key_cache.get(pub_key)
+        return vk.verify(base64.b64decode(signed_message.encode('utf-8')), message.encode('utf-8'))
+    # transactions come from the network, any malformed field only fails its own item
+    except Exception:
+        return False
+
+"""
+Return (pub key, signature, message) item of transaction signature,
+transactions are signed by owner of inputs, coinbase by the miner
+"""
+def get_signature_item(transaction):
+    if len(transaction.get_inputs()) > 0:
+        sender_pub_key = transaction.get_inputs()[0].get_current_owner()
+    else:
+        sender_pub_key = transaction.get_output().get_current_owner()
+    return (sender_pub_key, transaction.get_signature(), str(transaction.get_hash()))
+
+"""
+Verify a chunk of items in verifier process
+"""
+def verify_chunk(items):
+    return [verify_item(item) for item in items]
+
+class SignatureVerifier:
+    """
+    Verification of transaction signatures in a pool of processes
+    Batch is split into one chunk per worker and results keep the order of items
+    """
+    def __init__(self, worker_count):
+        self.__worker_count = max(1, worker_count)
+        self.__executor = None
+        self.__lock = Lock()
+        self.__stats = {
+            'batches': 0,
+            'items': 0,
+            'invalid': 0,
+            'elapsed': 0.0
+        }
+
+    def __get_executor(self):
+        with self.__lock:
+            # processes are started on first parallel batch
+            if self.__executor is None:
+                self.__executor = ProcessPoolExecutor(max_workers=self.__worker_count)
+            return self.__executor
+
+    """
+    Verify list of (pub key, signature, message) items,
+    return list of booleans in the same order
+    """
+    def verify_batch(self, items):
+        start = time()
+        items = list(items)
+        if len(items) < MIN_PARALLEL_BATCH or self.__worker_count == 1:
+            results = verify_chunk(items)
+        else:
+            chunk_size = -(-len(items) // self.__worker_count)
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+            results = []
+            for chunk_results in self.__get_executor().map(verify_chunk, chunks):
+                results.extend(chunk_results)
+        with self.__lock:
+            self.__stats['batches'] += 1
+            self.__stats['items'] += len(items)
+            self.__stats['invalid'] += results.count(False)
+            self.__stats['elapsed'] += time() - start
+        return results
+
+    """
+    Verify signatures of transactions, return list of booleans in order of transactions
+    """
+    def verify_transactions(self, transactions):
+        return self.verify_batch([get_signature_item(t) for t in transactions])
+
+    def get_stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats['workers'] = self.__worker_count
+        stats['items_per_second'] = round(stats['items'] / stats['elapsed'], 3) if stats['elapsed'] > 0 else 0.0
+        stats['elapsed'] = round(stats['elapsed'], 3)
+        return stats
+
+    def shutdown(self):
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown()
+                self.__executor = None
@@ -0,0 +1,107 @@
+from threading import RLock
+
+# connected blocks applied as a delta, a longer change of the best chain validates the whole pool
+MAX_TIP_DELTA = 16
+
+class TemplateBuilder:
+    """
+    Transactions of the next block template kept between miner restarts
+    Pool transactions are validated on admission for the current best chain tip,
+    when the tip is extended only transactions of connected blocks and their conflicts
+    leave the pool, so only transactions checked on another tip have to be validated again
+    Selection, its fees and coinbase are reused until the pool or the tip changes
+    """
+    def __init__(self, blockchain, mempool, max_transactions, validate, create_coinbase):
+        self.__lock = RLock()
+        self.__blockchain = blockchain
+        self.__mempool = mempool
+        self.__max_transactions = max_transactions
+        # validate(transactions) -> valid transactions, invalid ones are removed from the pool
+        # and valid ones are tagged with the tip they were checked on
+        self.__validate = validate
+        # create_coinbase(fees) -> coinbase transaction
+        self.__create_coinbase = create_coinbase
+        # tip for which transactions in the pool are valid
+        self.__tip_hash = None
+        self.__mempool_version = None
+        self.__transactions = []
+        self.__fees = 0
+        self.__coinbase = None
+        self.__stats = {
+            'templates': 0,
+            'reused': 0,
+            'selections': 0,
+            'tip_deltas': 0,
+            'revalidations': 0
+        }
+
+    """
+    Return list of blocks connected after the known tip, oldest first,
+    or None if the tip is not an ancestor of given head within MAX_TIP_DELTA blocks
+    """
+    def __get_connected_blocks(self, head):
+        blocks = []
+        block = head
+        while block is not None and len(blocks) < MAX_TIP_DELTA:
+            if block.get_hash() == self.__tip_hash:
+                return list(reversed(blocks))
+            blocks.append(block)
+            block = block.get_previous_block()
+        return None
+
+    """
+    Bring the pool up to date with the best chain
+    """
+    def __move_tip(self, head):
+        blocks = None if self.__tip_hash is None else self.__get_connected_blocks(head)
+        if blocks is not None:
+            for block in blocks:
+                self.__mempool.remove_transactions(block.get_data().get_transactions())
+            # transactions checked on another tip, e.g. on a branch which was left meanwhile
+            tip_hashes = {self.__tip_hash} | {block.get_hash() for block in blocks}
+            unchecked = self.__mempool.get_transactions_checked_outside(tip_hashes)
+            if unchecked:
+                self.__validate(unchecked)
+            self.__stats['tip_deltas'] += 1
+        else:
+            self.__validate(self.__mempool.get_transactions_by_fee_rate())
+            self.__stats['revalidations'] += 1
+        self.__tip_hash = head.get_hash()
+        # coinbase of previous tip may be already mined
+        self.__coinbase = None
+
+    def __select(self):
+        self.__transactions = self.__mempool.get_transactions_by_fee_rate(self.__max_transactions)
+        fees = round(sum(t.get_fee() for t in self.__transactions), 3)
+        if fees != self.__fees:
+            self.__coinbase = None
+        self.__fees = fees
+        self.__mempool_version = self.__mempool.get_version()
+        self.__stats['selections'] += 1
+
+    """
+    Return transactions of the next block with coinbase as the last one,
+    or empty list if there is nothing to mine
+    """
+    def get_transactions(self):
+        with self.__lock:
+            self.__stats['templates'] += 1
+            head = self.__blockchain.get_blockchain_head()
+            if head.get_hash() != self.__tip_hash:
+                self.__move_tip(head)
+            if self.__mempool_version != self.__mempool.get_version():
+                self.__select()
+            elif self.__coinbase is not None:
+                self.__stats['reused'] += 1
+            if not self.__transactions:
+                return []
+            if self.__coinbase is None:
+                self.__coinbase = self.__create_coinbase(self.__fees)
+            return self.__transactions + [self.__coinbase]
+
+    def get_stats(self):
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats['transactions'] = len(self.__transactions)
+            stats['fees'] = self.__fees
+            return stats
@@ -1,9 +1,23 @@
 from hashlib import sha256
+from sys import intern
+import json
 import uuid
 
 from model.transaction_tuples import InputTuple, OutputTuple
 
+# hash of str(dict) - used by genesis data and transactions created before versioning
+TRANSACTION_VERSION_LEGACY = 1
+# hash of canonical json encoding
+TRANSACTION_VERSION_CANONICAL = 2
+TRANSACTION_VERSION = TRANSACTION_VERSION_CANONICAL
+
 class Transaction:
+    # no per instance dictionary, a chain holds many transactions
+    __slots__ = (
+        '__id', '__is_coinbase', '__inputs', '__output', '__fee', '__signature', '__version',
+        '__hash', '__serialized', '__signed_serialized', '__legacy_str', '__signed_legacy_str'
+    )
+
     """
     Create transaction object from dict (static method)
     """
@@ -16,10 +30,12 @@ class Transaction:
         inputs = []
         for i in dict['inputs']:
             inputs.append(InputTuple(i['previous_id'], i['current_owner'], i['amount']))
-        transaction = Transaction(dict['is_coinbase'], inputs, output, dict['fee'], id=dict['id'], signature=dict['signature'])
+        # transactions without version field were created with legacy encoding
+        version = dict.get('version', TRANSACTION_VERSION_LEGACY)
+        transaction = Transaction(dict['is_coinbase'], inputs, output, dict['fee'], id=dict['id'], signature=dict['signature'], version=version)
         return transaction
 
-    def __init__(self, is_coinbase, inputs, output, fee, id=None, signature=None):
+    def __init__(self, is_coinbase, inputs, output, fee, id=None, signature=None, version=TRANSACTION_VERSION):
         if id is None:
             self.__id = str(uuid.uuid4())
         else:
@@ -31,6 +47,15 @@ class Transaction:
         self.__output = self.Output(output.new_owner, output.current_owner, output.new_amount, output.current_amount)
         self.__fee = fee
         self.__signature = signature
+        if version not in (TRANSACTION_VERSION_LEGACY, TRANSACTION_VERSION_CANONICAL):
+            raise Exception(f"Unsupported transaction version {version}")
+        self.__version = version
+        # transaction content is immutable, encodings and hash are calculated once
+        self.__hash = None
+        self.__serialized = None
+        self.__signed_serialized = None
+        self.__legacy_str = None
+        self.__signed_legacy_str = None
 
     """
     Map inputs (InputTuple) to Input class
@@ -66,16 +91,74 @@ class Transaction:
     def get_signature(self):
         return self.__signature
 
+    def get_version(self):
+        return self.__version
+
     """
     Caculate hash for transaction
     excluding signature field from dict
+    Legacy transactions hash str(dict), newer ones canonical encoding
     """
     def get_hash(self):
-        transaction = str(self.to_dict())
-        return sha256(transaction.encode('utf-8')).hexdigest()
+        if self.__hash is None:
+            if self.__version == TRANSACTION_VERSION_LEGACY:
+                transaction = self.get_legacy_str().encode('utf-8')
+            else:
+                transaction = self.get_serialized()
+            self.__hash = sha256(transaction).hexdigest()
+        return self.__hash
+
+    """
+    Return deterministic byte encoding of transaction:
+    json with sorted keys and without whitespaces
+    """
+    def get_serialized(self, include_signature=False):
+        serialized = self.__signed_serialized if include_signature else self.__serialized
+        if serialized is None:
+            serialized = json.dumps(
+                self.to_dict(include_signature),
+                sort_keys=True,
+                separators=(',', ':')
+            ).encode('utf-8')
+            if include_signature:
+                self.__signed_serialized = serialized
+            else:
+                self.__serialized = serialized
+        return serialized
 
+    """
+    Return str(dict) of transaction, part of legacy block and transaction hashes
+    """
+    def get_legacy_str(self, include_signature=False):
+        legacy_str = self.__signed_legacy_str if include_signature else self.__legacy_str
+        if legacy_str is None:
+            legacy_str = str(self.to_dict(include_signature))
+            if include_signature:
+                self.__signed_legacy_str = legacy_str
+            else:
+                self.__legacy_str = legacy_str
+        return legacy_str
+
+    """
+    Drop cached encodings, they are rebuilt on demand
+    Used for transactions kept in blocks, which are encoded rarely
+    """
+    def drop_encodings(self):
+        self.__serialized = None
+        self.__signed_serialized = None
+        self.__legacy_str = None
+        self.__signed_legacy_str = None
+
+    """
+    Transaction can be signed only once,
+    encodings which contain the signature are invalidated
+    """
     def set_signature(self, signature):
+        if self.__signature is not None:
+            raise Exception(f"Transaction {self.__id} is already signed")
         self.__signature = signature
+        self.__signed_serialized = None
+        self.__signed_legacy_str = None
 
     """
     Return transaction as a dictionary
@@ -91,15 +174,21 @@ class Transaction:
         transaction['fee'] = self.__fee
         if include_signature is True and not key_as_hex:
             transaction['signature'] = self.__signature
+        # legacy transactions keep their original dict, so stored hashes do not change
+        if self.__version != TRANSACTION_VERSION_LEGACY:
+            transaction['version'] = self.__version
         return transaction
 
     """
     The Output class represents output from transaction
     """
     class Output:
+        __slots__ = ('__new_owner', '__current_owner', '__new_amount', '__current_amount')
+
         def __init__(self, new_owner, current_owner, new_amount, current_amount):
-            self.__new_owner = new_owner
-            self.__current_owner = current_owner
+            # public keys repeat in many transactions, interned ones are stored once
+            self.__new_owner = intern(new_owner)
+            self.__current_owner = intern(current_owner)
             self.__new_amount = new_amount
             self.__current_amount = current_amount
 
@@ -134,9 +223,11 @@ class Transaction:
     The Input class represents output from transaction
     """
     class Input:
+        __slots__ = ('__previous_id', '__current_owner', '__amount')
+
         def __init__(self, previous_id, current_owner, amount):
             self.__previous_id = previous_id
-            self.__current_owner = current_owner
+            self.__current_owner = intern(current_owner)
             self.__amount = amount
 
         """
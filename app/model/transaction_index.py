@@ -0,0 +1,43 @@
+from threading import RLock
+
+class TransactionIndex:
+    """
+    Index of transactions on the best chain,
+    transaction id -> (block hash, position in block)
+    Updated when blocks are connected to or disconnected from the best chain
+    """
+    def __init__(self):
+        self.__lock = RLock()
+        self.__locations = {}
+
+    def connect_block(self, block_hash, transactions):
+        with self.__lock:
+            for position, transaction in enumerate(transactions):
+                self.__locations[transaction.get_id()] = (block_hash, position)
+
+    def disconnect_block(self, block_hash, transactions):
+        with self.__lock:
+            for transaction in transactions:
+                location = self.__locations.get(transaction.get_id())
+                if location is not None and location[0] == block_hash:
+                    del self.__locations[transaction.get_id()]
+
+    def export_state(self):
+        with self.__lock:
+            return {id: list(location) for id, location in self.__locations.items()}
+
+    def import_state(self, state):
+        with self.__lock:
+            self.__locations = {id: tuple(location) for id, location in state.items()}
+
+    """
+    Return (block hash, position) of transaction or None
+    """
+    def get(self, transaction_id):
+        return self.__locations.get(transaction_id)
+
+    def contains(self, transaction_id):
+        return transaction_id in self.__locations
+
+    def __len__(self):
+        return len(self.__locations)
@@ -0,0 +1,163 @@
+from threading import RLock
+
+class UtxoSet:
+    """
+    Unspent outputs of the best chain keyed by transaction id,
+    with secondary index by owner
+    Owners are kept as key ids of key registry, public API takes public keys
+    Updated incrementally when blocks are connected to or disconnected from the best chain
+    """
+    def __init__(self, key_registry):
+        self.__lock = RLock()
+        self.__key_registry = key_registry
+        # transaction id -> {owner key id: amount}
+        self.__outputs = {}
+        # owner key id -> {transaction id: amount}
+        self.__by_owner = {}
+        # block hash -> outputs spent by every transaction of the block, used to disconnect it
+        self.__undo = {}
+        # hash of the block the set is at, None while the best chain is being switched
+        self.__tip_hash = None
+        # changed whenever content of the set changes
+        self.__version = 0
+
+    """
+    Return (owner key id, amount) pairs credited by the transaction,
+    the owner is credited with new amount first and with change otherwise
+    """
+    def __credited_outputs(self, transaction):
+        output = transaction.get_output()
+        new_owner = self.__key_registry.get_id(output.get_new_owner())
+        current_owner = self.__key_registry.get_id(output.get_current_owner())
+        credited = []
+        if output.get_new_amount() > 0:
+            credited.append((new_owner, output.get_new_amount()))
+        # one owner is credited once
+        if (current_owner != new_owner or not credited) and output.get_current_amount() > 0:
+            credited.append((current_owner, output.get_current_amount()))
+        return credited
+
+    def __add(self, transaction_id, owner, amount):
+        self.__outputs.setdefault(transaction_id, {})[owner] = amount
+        self.__by_owner.setdefault(owner, {})[transaction_id] = amount
+
+    def __remove(self, transaction_id, owner):
+        outputs = self.__outputs.get(transaction_id)
+        if outputs is None or owner not in outputs:
+            return None
+        amount = outputs.pop(owner)
+        if not outputs:
+            del self.__outputs[transaction_id]
+        owner_outputs = self.__by_owner[owner]
+        del owner_outputs[transaction_id]
+        if not owner_outputs:
+            del self.__by_owner[owner]
+        return amount
+
+    """
+    Spend inputs and add outputs of block transactions,
+    spent outputs are remembered per transaction as undo data of the block
+    """
+    def connect_block(self, block_hash, transactions):
+        # key ids are resolved first, so a failing owner leaves the set untouched
+        resolved = [
+            (
+                transaction.get_id(),
+                [(i.get_previous_id(), self.__key_registry.get_id(i.get_current_owner())) for i in transaction.get_inputs()],
+                self.__credited_outputs(transaction)
+            )
+            for transaction in transactions
+        ]
+        with self.__lock:
+            undo = []
+            for transaction_id, inputs, credited in resolved:
+                spent = []
+                for previous_id, owner in inputs:
+                    amount = self.__remove(previous_id, owner)
+                    if amount is not None:
+                        spent.append((previous_id, owner, amount))
+                for owner, amount in credited:
+                    self.__add(transaction_id, owner, amount)
+                undo.append(spent)
+            self.__undo[block_hash] = undo
+            self.__version += 1
+
+    """
+    Revert connect_block transaction by transaction from the last one -
+    remove outputs of the transaction and restore outputs it spent,
+    so outputs created and spent within the block are not restored
+    """
+    def disconnect_block(self, block_hash, transactions):
+        with self.__lock:
+            undo = self.__undo.pop(block_hash, [])
+            for position in reversed(range(len(transactions))):
+                transaction = transactions[position]
+                for owner, _ in self.__credited_outputs(transaction):
+                    self.__remove(transaction.get_id(), owner)
+                for transaction_id, owner, amount in (undo[position] if position < len(undo) else []):
+                    self.__add(transaction_id, owner, amount)
+            self.__version += 1
+
+    """
+    Forget undo data of the block, it can not be disconnected any more
+    """
+    def remove_undo(self, block_hash):
+        with self.__lock:
+            self.__undo.pop(block_hash, None)
+
+    """
+    Return outputs and undo data as a dictionary which can be stored as JSON
+    """
+    def export_state(self):
+        with self.__lock:
+            # json object keys are strings, key ids are restored by import_state
+            return {
+                'outputs': {id: dict(outputs) for id, outputs in self.__outputs.items()},
+                'undo': {
+                    block_hash: [[list(spent) for spent in transaction_undo] for transaction_undo in undo]
+                    for block_hash, undo in self.__undo.items()
+                }
+            }
+
+    """
+    Replace content of the set with state returned by export_state
+    """
+    def import_state(self, state):
+        with self.__lock:
+            self.__outputs = {}
+            self.__by_owner = {}
+            for transaction_id, outputs in state['outputs'].items():
+                for owner, amount in outputs.items():
+                    self.__add(transaction_id, int(owner), amount)
+            self.__undo = {
+                block_hash: [[tuple(spent) for spent in transaction_undo] for transaction_undo in undo]
+                for block_hash, undo in state['undo'].items()
+            }
+            self.__tip_hash = None
+            self.__version += 1
+
+    def set_tip_hash(self, block_hash):
+        with self.__lock:
+            self.__tip_hash = block_hash
+
+    """
+    Return (version, tip hash), a check made between two equal results
+    with tip hash which is not None was made on the chain ending at that block
+    """
+    def get_tip(self):
+        with self.__lock:
+            return self.__version, self.__tip_hash
+
+    """
+    Return unspent outputs {transaction id: amount} of given owner
+    """
+    def get_unspent_outputs(self, owner):
+        # queries do not register keys
+        owner = self.__key_registry.find_id(owner)
+        with self.__lock:
+            return dict(self.__by_owner.get(owner, {}))
+
+    def get_amount(self, transaction_id, owner):
+        owner = self.__key_registry.find_id(owner)
+        with self.__lock:
+            return self.__outputs.get(transaction_id, {}).get(owner)
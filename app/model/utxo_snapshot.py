@@ -0,0 +1,61 @@
+from hashlib import sha256
+import json
+import os
+
+UTXO_SNAPSHOT_FILENAME = 'utxo_snapshot.dat'
+# version 2 - owners are stored as key ids (whole sha256 of the key)
+SNAPSHOT_VERSION = 2
+
+class UtxoSnapshot:
+    """
+    File with chain state (unspent outputs, their undo data and transaction index)
+    of the best chain ending at given block
+    The first line holds block hash, height and sha256 of the state following it,
+    the file is written to a temporary file and atomically renamed over the previous snapshot
+    """
+    def __init__(self, files_path, log):
+        self.__log = log
+        self.__files_path = files_path
+        self.__path = f"{files_path}/{UTXO_SNAPSHOT_FILENAME}"
+
+    """
+    Write snapshot of state of the chain ending at block with given hash and height
+    """
+    def write(self, block_hash, height, state):
+        payload = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'block_hash': block_hash,
+            'height': height,
+            'sha256': sha256(payload).hexdigest()
+        }
+        tmp_path = f"{self.__path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(json.dumps(meta).encode('utf-8') + b'\n' + payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.__path)
+        # make the rename itself durable
+        directory = os.open(self.__files_path, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    """
+    Return (block hash, height, state) of stored snapshot,
+    None if there is no snapshot or it is corrupted
+    """
+    def read(self):
+        if not os.path.exists(self.__path):
+            return None
+        try:
+            with open(self.__path, 'rb') as file:
+                meta = json.loads(file.readline())
+                payload = file.read()
+            if meta['version'] != SNAPSHOT_VERSION or sha256(payload).hexdigest() != meta['sha256']:
+                raise Exception("checksum or version mismatch")
+            return meta['block_hash'], meta['height'], json.loads(payload)
+        except Exception as e:
+            self.__log.error(f"UTXO snapshot could not be read, reason: {e}")
+            return None
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from threading import Lock
+from ecdsa import VerifyingKey
+from ecdsa.ellipticcurve import PointJacobi
+
+class VerifyingKeyCache:
+    """
+    Bounded LRU cache of parsed verifying keys keyed by PEM
+    Cached keys have precomputed multiplication tables, which makes
+    each signature check about twice as fast
+    """
+    def __init__(self, capacity):
+        self.__capacity = capacity
+        self.__lock = Lock()
+        self.__keys = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    """
+    Parse key from PEM and precompute its point tables,
+    point decoded from PEM lacks the curve order needed by precompute
+    """
+    def __parse(self, pem):
+        vk = VerifyingKey.from_pem(pem)
+        curve = vk.curve
+        point = vk.pubkey.point
+        point = PointJacobi(curve.curve, point.x(), point.y(), 1, curve.order, generator=True)
+        vk = VerifyingKey.from_public_point(point, curve=curve, hashfunc=vk.default_hashfunc)
+        vk.precompute()
+        return vk
+
+    def get(self, pem):
+        with self.__lock:
+            vk = self.__keys.get(pem)
+            if vk is not None:
+                self.__keys.move_to_end(pem)
+                self.__hits += 1
+                return vk
+            self.__misses += 1
+        vk = self.__parse(pem)
+        with self.__lock:
+            self.__keys[pem] = vk
+            while len(self.__keys) > self.__capacity:
+                self.__keys.popitem(last=False)
+                self.__evictions += 1
+        return vk
+
+    def get_stats(self):
+        lookups = self.__hits + self.__misses
+        return {
+            'size': len(self.__keys),
+            'capacity': self.__capacity,
+            'hits': self.__hits,
+            'misses': self.__misses,
+            'evictions': self.__evictions,
+            'hit_rate': self.__hits / lookups if lookups else 0.0
+        }
@@ -11,35 +11,6 @@ class Wallet:
         self.__key_manager = key_manager
         self.__blockchain = blockchain
 
-    """
-    Iterate through the entire blockchain and every transaction
-    Return transactions list which contains output for given pub_key or self
-    """
-    def __get_output_transactions(self, pub_key):
-        if pub_key is None:
-            pub_key = self.__key_manager.get_pub_key_str()
-        transactions = {}
-        block = self.__blockchain.get_blockchain_head()
-        while block is not None:
-            for t in block.get_data().get_transactions():
-                outputs = (t.get_output().get_new_owner(), t.get_output().get_current_owner())
-                if pub_key in outputs:
-                    transactions[t.get_id()] = t
-            block = block.get_previous_block()
-        return transactions
-
-    """
-    Remove transactions from list which exists in input
-    """
-    def __remove_input_transactions(self, transactions, pub_key):
-        block = self.__blockchain.get_blockchain_head()
-        while block is not None:
-            for t in block.get_data().get_transactions():
-                for i in t.get_inputs(): 
-                    if i.get_previous_id() in transactions.keys() and pub_key == i.get_current_owner():
-                        del transactions[i.get_previous_id()]
-            block = block.get_previous_block()
-
     """
     Return unspent outputs for given public key
     or collect own unspent outputs
@@ -47,15 +18,7 @@ class Wallet:
     def get_unspent_outputs(self, pub_key=None):
         if pub_key is None:
             pub_key = self.__key_manager.get_pub_key_str()
-        unspent_outputs = {}
-        transactions = self.__get_output_transactions(pub_key)
-        self.__remove_input_transactions(transactions, pub_key)
-        for t in transactions.values():
-            if t.get_output().get_new_owner() == pub_key and t.get_output().get_new_amount() > 0:
-                unspent_outputs[t.get_id()] = t.get_output().get_new_amount()
-            elif t.get_output().get_current_owner() == pub_key and t.get_output().get_current_amount() > 0:
-                unspent_outputs[t.get_id()] = t.get_output().get_current_amount()
-        return unspent_outputs
+        return self.__blockchain.get_utxo_set().get_unspent_outputs(pub_key)
 
     """
     Return own current balance
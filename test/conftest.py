@@ -0,0 +1,42 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from model.block_template import BlockTemplate
+
+DIFFICULTY_BITS = 4
+OWN_IP = 'http://node'
+
+
+def mine(parent, transactions=None):
+    template = BlockTemplate(parent.get_hash(), transactions or [], parent, DIFFICULTY_BITS)
+    target = 2 ** (256 - DIFFICULTY_BITS)
+    nonce = 0
+    while template.hash_nonce(nonce) >= target:
+        nonce += 1
+    return template.to_block(nonce)
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.ok = status_code == 200
+        self.status_code = status_code
+        self.__body = body
+
+    def json(self):
+        return self.__body
+
+
+class KeyManager:
+    """
+    Node at OWN_IP with given peers
+    """
+    def __init__(self, peer_ips):
+        self.__ips = [OWN_IP] + list(peer_ips)
+
+    def get_own_ip(self):
+        return OWN_IP
+
+    def get_pub_key_list(self):
+        return {'entries': [{'ip': ip} for ip in self.__ips]}
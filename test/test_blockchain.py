@@ -0,0 +1,297 @@
+import logging
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import model.blockchain
+from model.block_log import INDEX_ENTRY
+from model.blockchain import Blockchain
+from model.transaction import Transaction
+from model.transaction_tuples import InputTuple, OutputTuple
+from conftest import DIFFICULTY_BITS, mine
+
+log = logging.getLogger('test')
+
+
+def deliver(blockchain, block):
+    valid, is_orphan, received = blockchain.check_block(block.to_dict())
+    assert valid
+    if is_orphan:
+        blockchain.add_to_orphan_list(received)
+    else:
+        blockchain.add_block(received)
+
+
+def recompute_best_head(blockchain):
+    # full recomputation - walk every branch to genesis
+    heads = []
+    for head in blockchain.get_blockchain_head_list():
+        count = 0
+        block = head
+        while block is not None:
+            count += 1
+            block = block.get_previous_block()
+        heads.append((-count, head.get_hash()))
+    return min(heads)[1]
+
+
+def test_best_head_matches_full_recomputation(tmp_path):
+    rng = random.Random(7)
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    blocks = [blockchain.get_blockchain_head()]
+    for _ in range(40):
+        block = mine(rng.choice(blocks))
+        blocks.append(block)
+        deliver(blockchain, block)
+        assert blockchain.get_blockchain_head().get_hash() == recompute_best_head(blockchain)
+
+
+def test_best_head_with_orphans_delivered_out_of_order(tmp_path):
+    rng = random.Random(11)
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    blocks = [blockchain.get_blockchain_head()]
+    for _ in range(10):
+        blocks.append(mine(blocks[-1]))
+    received = blocks[1:]
+    rng.shuffle(received)
+    for block in received:
+        deliver(blockchain, block)
+    assert blockchain.get_block_count()['count'] == len(blocks)
+    assert blockchain.get_blockchain_head().get_hash() == blocks[-1].get_hash()
+    assert blockchain.get_blockchain_head().get_hash() == recompute_best_head(blockchain)
+
+
+def test_orphan_tree_connects_when_root_arrives(tmp_path):
+    rng = random.Random(13)
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    root = mine(blockchain.get_blockchain_head())
+    blocks = [root]
+    for i in range(30):
+        # coinbase makes blocks mined on the same parent differ
+        coinbase = Transaction(True, [], OutputTuple(f'miner-{i}', f'miner-{i}', 1, 0), 0)
+        blocks.append(mine(rng.choice(blocks), [coinbase]))
+    received = blocks[1:]
+    rng.shuffle(received)
+    for block in received:
+        deliver(blockchain, block)
+    assert blockchain.get_orphan_pool_stats()['blocks'] == len(received)
+
+    deliver(blockchain, root)
+    assert blockchain.get_orphan_pool_stats()['blocks'] == 0
+    assert len(blockchain.get_block_index()) == len(blocks) + 1
+    assert blockchain.get_blockchain_head().get_hash() == recompute_best_head(blockchain)
+
+
+def test_redelivered_block_does_not_become_head_again(tmp_path):
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    first = mine(blockchain.get_blockchain_head())
+    second = mine(first)
+    deliver(blockchain, first)
+    deliver(blockchain, second)
+    for block in (first, second):
+        deliver(blockchain, block)
+
+    assert [head.get_hash() for head in blockchain.get_blockchain_head_list()] == [second.get_hash()]
+    assert len(blockchain.get_block_index()) == 3
+    assert len(Blockchain(str(tmp_path), log, DIFFICULTY_BITS).get_block_index()) == 3
+
+
+def recompute_unspent_outputs(blockchain, owner):
+    # full recomputation - walk the best chain
+    outputs = {}
+    spent = set()
+    block = blockchain.get_blockchain_head()
+    while block is not None:
+        for t in block.get_data().get_transactions():
+            output = t.get_output()
+            if output.get_new_owner() == owner and output.get_new_amount() > 0:
+                outputs[t.get_id()] = output.get_new_amount()
+            elif output.get_current_owner() == owner and output.get_current_amount() > 0:
+                outputs[t.get_id()] = output.get_current_amount()
+            for i in t.get_inputs():
+                if i.get_current_owner() == owner:
+                    spent.add(i.get_previous_id())
+        block = block.get_previous_block()
+    return {id: amount for id, amount in outputs.items() if id not in spent}
+
+
+def on_best_chain(blockchain, block):
+    current = blockchain.get_blockchain_head()
+    while current is not None:
+        if current.get_hash() == block.get_hash():
+            return True
+        current = current.get_previous_block()
+    return False
+
+
+def test_chain_state_follows_best_chain_switches(tmp_path):
+    rng = random.Random(5)
+    owners = ['alice', 'bob', 'carol']
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    blocks = [blockchain.get_blockchain_head()]
+    for _ in range(60):
+        # mostly extend the best chain, sometimes fork from a random block
+        parent = blockchain.get_blockchain_head() if rng.random() < 0.7 else rng.choice(blocks)
+        owner = rng.choice(owners)
+        transactions = [Transaction(True, [], OutputTuple(owner, owner, rng.randint(1, 9), 0), 0)]
+        # spend outputs which are unspent on the current best chain
+        if blockchain.get_blockchain_head().get_hash() == parent.get_hash():
+            unspent = blockchain.get_utxo_set().get_unspent_outputs(owner)
+            if unspent:
+                id, amount = rng.choice(list(unspent.items()))
+                receiver = rng.choice(owners)
+                transactions.append(Transaction(
+                    False, [InputTuple(id, owner, amount)], OutputTuple(receiver, owner, amount, 0), 0
+                ))
+        block = mine(parent, transactions)
+        blocks.append(block)
+        deliver(blockchain, block)
+        for owner in owners:
+            assert blockchain.get_utxo_set().get_unspent_outputs(owner) == \
+                recompute_unspent_outputs(blockchain, owner)
+        for stored in blocks[1:]:
+            for t in stored.get_data().get_transactions():
+                location = blockchain.get_transaction(t.get_id())
+                assert (location is not None) == on_best_chain(blockchain, stored)
+
+
+def test_disconnecting_block_with_spend_chain_leaves_no_outputs(tmp_path):
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    genesis = blockchain.get_blockchain_head()
+    coinbase = Transaction(True, [], OutputTuple('alice', 'alice', 5, 0), 0)
+    to_bob = Transaction(False, [InputTuple(coinbase.get_id(), 'alice', 5)], OutputTuple('bob', 'alice', 5, 0), 0)
+    to_carol = Transaction(False, [InputTuple(to_bob.get_id(), 'bob', 5)], OutputTuple('carol', 'bob', 5, 0), 0)
+    deliver(blockchain, mine(genesis, [coinbase, to_bob, to_carol]))
+    assert blockchain.get_utxo_set().get_unspent_outputs('carol') == {to_carol.get_id(): 5}
+
+    block = genesis
+    for i in range(2):
+        block = mine(block, [Transaction(True, [], OutputTuple(f'miner-{i}', f'miner-{i}', 1, 0), 0)])
+        deliver(blockchain, block)
+    assert blockchain.get_blockchain_head().get_hash() == block.get_hash()
+    for owner in ('alice', 'bob', 'carol'):
+        assert blockchain.get_utxo_set().get_unspent_outputs(owner) == {}
+
+
+def test_malformed_header_is_rejected(tmp_path):
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    block_dict = mine(blockchain.get_blockchain_head()).to_dict()
+    for key, value in (('timestamp', None), ('bits', None), ('merkle_root', None), ('nonce', '1'), ('bits', 2 ** 32)):
+        header = dict(block_dict['header'])
+        if value is None:
+            del header[key]
+        else:
+            header[key] = value
+        valid, is_orphan, _ = blockchain.check_block(dict(block_dict, header=header))
+        assert (valid, is_orphan) == (False, False)
+        assert not blockchain.check_header(dict(header, hash='00' * 32), 1)
+
+
+def test_reorg_detaches_transactions_missing_on_new_branch(tmp_path):
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    genesis = blockchain.get_blockchain_head()
+    coinbase = Transaction(True, [], OutputTuple('alice', 'alice', 5, 0), 0)
+    funded = mine(genesis, [coinbase])
+    deliver(blockchain, funded)
+    kept = Transaction(False, [InputTuple(coinbase.get_id(), 'alice', 5)], OutputTuple('bob', 'alice', 1, 4), 0)
+    dropped = Transaction(False, [InputTuple(kept.get_id(), 'bob', 1)], OutputTuple('carol', 'bob', 1, 0), 0)
+    old_branch = mine(funded, [kept])
+    deliver(blockchain, old_branch)
+    deliver(blockchain, mine(old_branch, [dropped]))
+    assert blockchain.pop_detached_transactions() == []
+
+    block = funded
+    for i, transactions in enumerate(([kept], [], [])):
+        reward = Transaction(True, [], OutputTuple(f'miner-{i}', f'miner-{i}', 1, 0), 0)
+        block = mine(block, transactions + [reward])
+        deliver(blockchain, block)
+    assert blockchain.get_blockchain_head().get_hash() == block.get_hash()
+    assert [t.get_id() for t in blockchain.pop_detached_transactions()] == [dropped.get_id()]
+    assert blockchain.get_reorg_stats()['max_depth'] == 2
+
+
+def test_restart_restores_chain_state_from_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(model.blockchain, 'SNAPSHOT_INTERVAL', 5)
+    rng = random.Random(17)
+    owners = ['alice', 'bob']
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    blocks = [blockchain.get_blockchain_head()]
+    for i in range(23):
+        parent = blockchain.get_blockchain_head() if rng.random() < 0.8 else rng.choice(blocks)
+        owner = rng.choice(owners)
+        block = mine(parent, [Transaction(True, [], OutputTuple(owner, owner, i + 1, 0), 0)])
+        blocks.append(block)
+        deliver(blockchain, block)
+    blockchain.wait_for_snapshot()
+    assert (tmp_path / 'utxo_snapshot.dat').exists()
+
+    restarted = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    restarted.wait_for_snapshot()
+    assert restarted.get_blockchain_head().get_hash() == blockchain.get_blockchain_head().get_hash()
+    for owner in owners:
+        assert restarted.get_utxo_set().get_unspent_outputs(owner) == \
+            blockchain.get_utxo_set().get_unspent_outputs(owner)
+
+    # corrupted snapshot falls back to replaying the whole chain
+    data = (tmp_path / 'utxo_snapshot.dat').read_bytes()
+    (tmp_path / 'utxo_snapshot.dat').write_bytes(data[:-10] + b'0' * 10)
+    rebuilt = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    for owner in owners:
+        assert rebuilt.get_utxo_set().get_unspent_outputs(owner) == \
+            recompute_unspent_outputs(blockchain, owner)
+
+
+def test_undo_is_kept_only_for_max_reorg_depth(tmp_path, monkeypatch):
+    monkeypatch.setattr(model.blockchain, 'MAX_REORG_DEPTH', 3)
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    genesis = blockchain.get_blockchain_head()
+    block = genesis
+    for i in range(6):
+        block = mine(block, [Transaction(True, [], OutputTuple('alice', 'alice', i + 1, 0), 0)])
+        deliver(blockchain, block)
+    assert len(blockchain.get_utxo_set().export_state()['undo']) == 3
+
+    # a longer branch forking below the kept undo data is not switched to
+    fork = genesis
+    for i in range(7):
+        fork = mine(fork, [Transaction(True, [], OutputTuple('bob', 'bob', i + 1, 0), 0)])
+        deliver(blockchain, fork)
+    assert blockchain.get_blockchain_head().get_hash() == block.get_hash()
+    assert blockchain.get_reorg_stats()['refused'] > 0
+    assert blockchain.get_utxo_set().get_unspent_outputs('bob') == {}
+
+    # restart makes the same choice
+    restarted = Blockchain(str(tmp_path), log, DIFFICULTY_BITS)
+    assert restarted.get_blockchain_head().get_hash() == block.get_hash()
+    assert restarted.get_utxo_set().get_unspent_outputs('alice') == \
+        blockchain.get_utxo_set().get_unspent_outputs('alice')
+    assert restarted.get_utxo_set().get_unspent_outputs('bob') == {}
+
+
+def test_torn_block_log_is_recovered_with_lazy_blocks(tmp_path):
+    blockchain = Blockchain(str(tmp_path), log, DIFFICULTY_BITS, lazy_blocks=True)
+    blocks = [blockchain.get_blockchain_head()]
+    for i in range(6):
+        blocks.append(mine(blocks[-1], [Transaction(True, [], OutputTuple('alice', 'alice', i + 1, 0), 0)]))
+        deliver(blockchain, blocks[-1])
+    # the last record is torn in the middle, the index is cut inside its fourth entry
+    log_path, index_path = tmp_path / 'blocks.dat', tmp_path / 'blocks.idx'
+    log_path.write_bytes(log_path.read_bytes()[:-20])
+    index_path.write_bytes(index_path.read_bytes()[:3 * INDEX_ENTRY.size + 17])
+
+    restarted = Blockchain(str(tmp_path), log, DIFFICULTY_BITS, lazy_blocks=True)
+    assert len(restarted.get_block_index()) == 6
+    assert restarted.get_blockchain_head().get_hash() == blocks[-2].get_hash()
+    for block in blocks[1:-1]:
+        stored = restarted.get_block_index().get(block.get_hash()).get_block()
+        assert [t.get_id() for t in stored.get_data().get_transactions()] == \
+            [t.get_id() for t in block.get_data().get_transactions()]
+    assert restarted.get_block_cache_stats()['misses'] > 0
+
+    # blocks appended after the recovery are read back after the next restart
+    deliver(restarted, blocks[-1])
+    again = Blockchain(str(tmp_path), log, DIFFICULTY_BITS, lazy_blocks=True)
+    assert again.get_blockchain_head().get_hash() == blocks[-1].get_hash()
+    assert len(again.get_block_index()) == 7
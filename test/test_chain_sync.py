@@ -0,0 +1,157 @@
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import model.chain_sync
+from model.block import Block
+from model.blockchain import Blockchain
+from model.chain_sync import ChainSync, SYNC_DONE, SYNC_FAILED
+from model.gossip import Gossip
+from model.key_registry import KeyRegistry
+from model.transaction import Transaction
+from model.transaction_tuples import OutputTuple
+from conftest import DIFFICULTY_BITS, KeyManager, Response, mine
+
+BAD_IP = 'http://bad'
+PEER_IP = 'http://peer'
+# faults of BAD_IP
+NO_BODIES = 'no-bodies'
+CHANGED_HEADERS = 'changed-headers'
+CHANGED_TRANSACTIONS = 'changed-transactions'
+BAD_HEADERS = 'bad-headers'
+log = logging.getLogger('test')
+
+
+class PeerClient:
+    """
+    Serves headers and blocks of source blockchain, BAD_IP serves them with given fault
+    """
+    def __init__(self, source, fault):
+        self.source = source
+        self.fault = fault
+        self.requests = []
+
+    def post(self, ip, endpoint, json=None):
+        self.requests.append((ip, endpoint))
+        bad = ip == BAD_IP
+        if endpoint == '/headers':
+            headers = self.source.get_headers(json['locator'], json['limit'])
+            if bad and self.fault == BAD_HEADERS:
+                # made up legacy header, header with missing field and not a header
+                genesis_hash = self.source.get_block_locator()[-1]
+                headers = headers[:1] + [{'previous_block_hash': genesis_hash, 'nonce': 0, 'hash': 'ab' * 32}]
+                headers += [{'previous_block_hash': genesis_hash}, 'header']
+            return Response(headers)
+        if bad and self.fault == NO_BODIES:
+            return Response({}, 500)
+        blocks = []
+        for item in json['inventory']:
+            entry = self.source.get_block_index().get(item['hash'])
+            if entry is None:
+                continue
+            block_dict = entry.get_block().to_dict()
+            if bad and self.fault == CHANGED_HEADERS:
+                block_dict['header'] = dict(block_dict['header'], nonce=block_dict['header']['nonce'] + 1)
+            if bad and self.fault == CHANGED_TRANSACTIONS:
+                block_dict['data'] = block_dict['data'][:-1]
+            blocks.append(block_dict)
+        return Response({'blocks': blocks, 'transactions': []})
+
+
+class SignatureVerifier:
+    def verify_transactions(self, transactions):
+        return [True] * len(transactions)
+
+
+class Miner:
+    def __init__(self):
+        self.resets = 0
+
+    def restore_detached_transactions(self):
+        pass
+
+    def reset_miner_after_new_candidate_request(self, broadcast):
+        self.resets += 1
+
+
+def coinbase(i):
+    return Transaction(True, [], OutputTuple('alice', 'alice', i + 1, 0), 0)
+
+
+def mine_legacy(parent, transactions):
+    nonce = 0
+    while True:
+        block = Block(parent.get_hash(), nonce, transactions, parent)
+        if int(block.get_hash(), 16) < 2 ** (256 - DIFFICULTY_BITS):
+            return block
+        nonce += 1
+
+
+def make_source(path, legacy_count, count):
+    path.mkdir()
+    source = Blockchain(str(path), log, DIFFICULTY_BITS)
+    for i in range(legacy_count + count):
+        parent = source.get_blockchain_head()
+        # every block carries two transactions, so one can be left out
+        transactions = [coinbase(i), coinbase(i + 1000)]
+        block = mine_legacy(parent, transactions) if i < legacy_count else mine(parent, transactions)
+        valid, is_orphan, received = source.check_block(block.to_dict())
+        assert valid and not is_orphan
+        source.add_block(received)
+    return source
+
+
+def sync(path, source, fault):
+    path.mkdir()
+    blockchain = Blockchain(str(path), log, DIFFICULTY_BITS)
+    peer_client = PeerClient(source, fault)
+    miner = Miner()
+    # bad peer is asked first
+    key_manager = KeyManager([BAD_IP, PEER_IP])
+    gossip = Gossip(log, key_manager, peer_client, blockchain, miner, KeyRegistry())
+    chain_sync = ChainSync(log, key_manager, peer_client, blockchain, SignatureVerifier(), miner, gossip)
+    assert chain_sync.start()
+    deadline = time.time() + 30
+    while chain_sync.get_status()['state'] not in (SYNC_DONE, SYNC_FAILED) and time.time() < deadline:
+        time.sleep(0.01)
+    return blockchain, miner, peer_client, chain_sync.get_status()
+
+
+def assert_synchronized(blockchain, source, status, count):
+    assert status['state'] == SYNC_DONE
+    assert status['blocks_connected'] == count
+    assert blockchain.get_blockchain_head().get_hash() == source.get_blockchain_head().get_hash()
+    assert blockchain.get_utxo_set().get_unspent_outputs('alice') == \
+        source.get_utxo_set().get_unspent_outputs('alice')
+
+
+def test_failed_batch_is_downloaded_from_next_peer(tmp_path, monkeypatch):
+    monkeypatch.setattr(model.chain_sync, 'BODIES_BATCH', 3)
+    source = make_source(tmp_path / 'source', 3, 8)
+    blockchain, miner, peer_client, status = sync(tmp_path / 'node', source, NO_BODIES)
+
+    assert_synchronized(blockchain, source, status, 11)
+    # the first batch holds legacy blocks downloaded with their headers, the third one is refused by the bad peer
+    getdata = [ip for ip, endpoint in peer_client.requests if endpoint == '/getdata']
+    assert getdata.count(BAD_IP) == 1 + 1 and getdata.count(PEER_IP) == 1 + 3
+    assert miner.resets == 1
+
+
+def test_blocks_not_matching_their_headers_are_downloaded_from_next_peer(tmp_path):
+    source = make_source(tmp_path / 'source', 0, 3)
+    for fault in (CHANGED_HEADERS, CHANGED_TRANSACTIONS):
+        blockchain, _, peer_client, status = sync(tmp_path / fault, source, fault)
+        assert_synchronized(blockchain, source, status, 3)
+        assert (BAD_IP, '/getdata') in peer_client.requests
+
+
+def test_bad_headers_drop_the_batch_of_the_peer(tmp_path):
+    source = make_source(tmp_path / 'source', 1, 2)
+    blockchain, _, peer_client, status = sync(tmp_path / 'node', source, BAD_HEADERS)
+
+    assert_synchronized(blockchain, source, status, 3)
+    assert status['headers'] == 3
+    assert (PEER_IP, '/headers') in peer_client.requests
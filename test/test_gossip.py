@@ -0,0 +1,96 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+import model.gossip
+from model.block import Block, BLOCK_VERSION_MERKLE
+from model.gossip import Gossip, INV_BLOCK
+from model.key_registry import KeyRegistry
+from conftest import KeyManager, Response
+
+PEER_IP = 'http://peer'
+OTHER_IP = 'http://other'
+BAD_NONCE = 13
+
+
+class PeerClient:
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.requests = []
+        self.broadcasts = []
+
+    def post(self, ip, endpoint, json=None):
+        self.requests.append((ip, endpoint, json))
+        hashes = [item['hash'] for item in json['inventory']]
+        return Response({'blocks': [b.to_dict() for b in self.blocks if b.get_hash() in hashes], 'transactions': []})
+
+    def broadcast(self, ips, endpoint, json=None):
+        self.broadcasts.append((list(ips), endpoint, json))
+        return {}
+
+
+class BlockIndex:
+    def __init__(self):
+        self.hashes = set()
+
+    def contains(self, block_hash):
+        return block_hash in self.hashes
+
+
+class Blockchain:
+    def __init__(self):
+        self.index = BlockIndex()
+
+    def get_block_index(self):
+        return self.index
+
+
+class Miner:
+    def __init__(self, blockchain):
+        self.blockchain = blockchain
+
+    def verify_and_save_candidate(self, block_dict):
+        if block_dict['header']['nonce'] == BAD_NONCE:
+            raise Exception("broken block")
+        block = Block.from_dict_to_block(block_dict)
+        self.blockchain.get_block_index().hashes.add(block.get_hash())
+        return block
+
+    def has_transaction(self, transaction_id):
+        return False
+
+
+class SyncThread:
+    def __init__(self, target, args):
+        self.__target = target
+        self.__args = args
+
+    def start(self):
+        self.__target(*self.__args)
+
+
+def make_block(nonce):
+    return Block('00' * 32, nonce, [], None, version=BLOCK_VERSION_MERKLE, timestamp=0, bits=4)
+
+
+def test_fetched_blocks_are_accepted_and_failed_ones_can_be_fetched_again(monkeypatch):
+    monkeypatch.setattr(model.gossip, 'Thread', SyncThread)
+    good, bad = make_block(1), make_block(BAD_NONCE)
+    peer_client = PeerClient([good, bad])
+    blockchain = Blockchain()
+    gossip = Gossip(logging.getLogger('test'), KeyManager([PEER_IP, OTHER_IP]), peer_client, blockchain, Miner(blockchain), KeyRegistry())
+    inventory = [{'type': INV_BLOCK, 'hash': b.get_hash()} for b in (good, bad)]
+
+    gossip.handle_inv({'ip': PEER_IP, 'inventory': inventory})
+    assert peer_client.requests[0][1] == '/getdata'
+    assert blockchain.get_block_index().contains(good.get_hash())
+    # accepted block is announced to other peers only
+    ips, endpoint, body = peer_client.broadcasts[0]
+    assert endpoint == '/inv' and ips == [OTHER_IP]
+    assert body['inventory'] == [{'type': INV_BLOCK, 'hash': good.get_hash()}]
+    assert gossip.get_stats()['accepted'] == 1
+
+    assert gossip.handle_inv({'ip': OTHER_IP, 'inventory': inventory}) == "1 item(s) requested"
+    assert peer_client.requests[-1][2]['inventory'] == [{'type': INV_BLOCK, 'hash': bad.get_hash()}]
@@ -0,0 +1,49 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from model.key_registry import KeyRegistry, get_key_id
+from model.transaction import Transaction
+from model.transaction_tuples import InputTuple, OutputTuple
+from model.utxo_set import UtxoSet
+
+ALICE = '-----BEGIN PUBLIC KEY-----\nalice\n-----END PUBLIC KEY-----\n'
+BOB = '-----BEGIN PUBLIC KEY-----\nbob\n-----END PUBLIC KEY-----\n'
+
+
+def test_compact_transaction_restores_the_same_transaction():
+    sender = KeyRegistry()
+    receiver = KeyRegistry()
+    transaction = Transaction(False, [InputTuple('previous', ALICE, 1.0)], OutputTuple(BOB, ALICE, 0.5, 0.498), 0.002, signature='signature')
+    compact = json.loads(json.dumps(sender.compact_transaction(transaction.to_dict(True))))
+    assert compact['output']['new_owner'] == get_key_id(BOB)
+
+    assert sorted(receiver.get_unknown_ids([compact])) == sorted([get_key_id(ALICE), get_key_id(BOB)])
+    with pytest.raises(Exception):
+        receiver.expand_transaction(compact)
+    receiver.add_keys({str(get_key_id(ALICE)): ALICE, str(get_key_id(BOB)): BOB})
+    restored = Transaction.from_dict_to_transaction(receiver.expand_transaction(compact))
+    assert restored.get_hash() == transaction.get_hash()
+    assert restored.get_serialized(True) == transaction.get_serialized(True)
+
+
+def test_key_not_matching_its_id_is_rejected():
+    registry = KeyRegistry()
+    with pytest.raises(Exception):
+        registry.add_keys({str(get_key_id(ALICE)): BOB})
+    assert registry.get_pem(get_key_id(ALICE)) is None
+
+
+def test_utxo_queries_do_not_register_keys():
+    registry = KeyRegistry()
+    utxo_set = UtxoSet(registry)
+    utxo_set.connect_block('block', [Transaction(True, [], OutputTuple(ALICE, ALICE, 5, 0), 0)])
+    assert len(registry) == 1
+    assert utxo_set.get_unspent_outputs(BOB) == {}
+    assert utxo_set.get_amount('previous', BOB) is None
+    assert len(registry) == 1
+    assert registry.find_id(ALICE) == get_key_id(ALICE)
@@ -0,0 +1,98 @@
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from model.block import Block
+from model.mempool import Mempool, REJECT_CONFLICT, REJECT_DUPLICATE
+from model.template_builder import TemplateBuilder
+from model.transaction import Transaction
+from model.transaction_tuples import InputTuple, OutputTuple
+
+
+def make_transaction(previous_id, fee):
+    return Transaction(False, [InputTuple(previous_id, 'owner', 1.0)], OutputTuple('receiver', 'owner', 0.5, 0.5 - fee), fee)
+
+
+def test_pool_keeps_best_fee_rate_within_caps():
+    random.seed(3)
+    mempool = Mempool(10, 10 ** 9)
+    transactions = [make_transaction(f'previous-{i}', random.choice([0.001, 0.002, 0.003])) for i in range(40)]
+    for transaction in transactions:
+        mempool.add(transaction)
+
+    assert len(mempool) == 10
+    assert mempool.get_stats()['evicted'] == 30
+    fees = [t.get_fee() for t in mempool.get_transactions_by_fee_rate()]
+    assert fees == sorted(fees, reverse=True)
+    assert fees == sorted((t.get_fee() for t in transactions), reverse=True)[:10]
+
+    mempool.remove_transactions(transactions)
+    assert len(mempool) == 0
+    assert mempool.get_stats()['bytes'] == 0
+
+
+def test_duplicates_and_conflicts_are_not_added():
+    mempool = Mempool(10, 10 ** 9)
+    transaction = make_transaction('previous', 0.001)
+    assert mempool.add(transaction) is None
+
+    copy = Transaction.from_dict_to_transaction(json.loads(json.dumps(transaction.to_dict(True))))
+    assert mempool.add(copy) == REJECT_DUPLICATE
+    assert mempool.add(make_transaction('previous', 0.002)) == REJECT_CONFLICT
+    assert mempool.get_spending_transaction_id(('previous', 'owner')) == transaction.get_id()
+
+    mempool.remove_transactions([copy])
+    assert not mempool.contains(transaction.get_id())
+    assert mempool.get_spending_transaction_id(('previous', 'owner')) is None
+
+
+def test_block_transactions_evict_conflicting_pool_transactions():
+    mempool = Mempool(10, 10 ** 9)
+    pooled = make_transaction('previous', 0.001)
+    other = make_transaction('other', 0.001)
+    mempool.add(pooled)
+    mempool.add(other)
+
+    mempool.remove_transactions([make_transaction('previous', 0.003)])
+    assert not mempool.contains(pooled.get_id())
+    assert mempool.contains(other.get_id())
+    assert len(mempool) == 1
+
+
+class Blockchain:
+    def __init__(self, head):
+        self.head = head
+
+    def get_blockchain_head(self):
+        return self.head
+
+
+def test_transactions_checked_on_another_tip_are_validated_again():
+    tip = Block(None, 1, [], None)
+    side = Block(tip.get_hash(), 2, [], tip)
+    child = Block(tip.get_hash(), 3, [], tip)
+    mempool = Mempool(10, 10 ** 9)
+    validated = []
+
+    def validate(transactions):
+        # everything validated here spends an output of the side branch
+        validated.append(transactions)
+        for transaction in transactions:
+            mempool.remove(transaction.get_id())
+        return []
+
+    blockchain = Blockchain(tip)
+    builder = TemplateBuilder(blockchain, mempool, 10, validate, lambda fees: make_transaction('coinbase', 0))
+    builder.get_transactions()
+    kept = make_transaction('kept', 0.001)
+    stale = make_transaction('stale', 0.001)
+    mempool.add(kept, tip.get_hash())
+    mempool.add(stale, side.get_hash())
+
+    blockchain.head = child
+    assert builder.get_transactions()[:-1] == [kept]
+    assert validated[-1] == [stale]
+    assert builder.get_stats()['tip_deltas'] == 1
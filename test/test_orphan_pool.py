@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from model.block import Block
+from model.orphan_pool import OrphanPool
+
+
+def make_block(previous_hash, nonce):
+    return Block(previous_hash, nonce, [], None)
+
+
+def test_oldest_orphans_are_evicted_and_children_are_found_by_parent():
+    pool = OrphanPool(3, 60)
+    blocks = [make_block(f'missing-{i % 2}', i) for i in range(5)]
+    for block in blocks:
+        assert pool.add(block)
+    assert not pool.add(blocks[-1])
+
+    assert len(pool) == 3
+    assert pool.get_stats()['evicted'] == 2
+    assert not pool.contains(blocks[0].get_hash())
+    children = pool.pop_children('missing-0')
+    assert sorted(b.get_hash() for b in children) == sorted(b.get_hash() for b in (blocks[2], blocks[4]))
+    assert len(pool) == 1
+
+
+def test_orphans_expire():
+    pool = OrphanPool(10, 0)
+    pool.add(make_block('missing', 1))
+    pool.add(make_block('missing', 2))
+    assert len(pool) == 1
@@ -0,0 +1,110 @@
+from base64 import b64encode
+from random import Random
+from sys import argv, executable, path
+from tempfile import mkdtemp
+from time import time
+from uuid import UUID
+import json
+import os
+import resource
+import shutil
+import subprocess
+
+# usage: python memory_benchmark.py [--baseline REV | --app DIR] [transactions] [keys] [transactions per block]
+# --baseline REV checks out git revision REV (e.g. the parent of the commit which shrank blocks)
+# into a temporary worktree and runs the benchmark on it and on the current tree, before first
+# --app DIR measures the app directory of another checkout
+OPTIONS = {}
+ARGUMENTS = argv[1:]
+while len(ARGUMENTS) > 1 and ARGUMENTS[0].startswith('--'):
+    OPTIONS[ARGUMENTS[0]] = ARGUMENTS[1]
+    ARGUMENTS = ARGUMENTS[2:]
+BASELINE = OPTIONS.get('--baseline')
+REPOSITORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+APP_PATH = OPTIONS.get('--app', os.path.join(REPOSITORY_PATH, 'app'))
+TRANSACTIONS = int(ARGUMENTS[0]) if len(ARGUMENTS) > 0 else 1000000
+KEYS = int(ARGUMENTS[1]) if len(ARGUMENTS) > 1 else 1000
+TRANSACTIONS_PER_BLOCK = int(ARGUMENTS[2]) if len(ARGUMENTS) > 2 else 1000
+
+path.insert(0, APP_PATH)
+
+from model.block import Block, BLOCK_VERSION_MERKLE
+
+def make_pem(rng):
+    body = b64encode(rng.randbytes(88)).decode()
+    return f"-----BEGIN PUBLIC KEY-----\n{body[:64]}\n{body[64:]}\n-----END PUBLIC KEY-----\n"
+
+"""
+Return block dictionary as received from a peer or read from block log,
+every owner is a separate string like after json decoding
+"""
+def make_block_dict(rng, keys, previous_hash, count):
+    transactions = []
+    for _ in range(count):
+        sender, receiver = rng.choice(keys), rng.choice(keys)
+        transactions.append({
+            'id': str(UUID(int=rng.getrandbits(128))),
+            'is_coinbase': False,
+            'inputs': [{'previous_id': str(UUID(int=rng.getrandbits(128))), 'current_owner': sender, 'amount': 1.5}],
+            'output': {'new_owner': receiver, 'current_owner': sender, 'new_amount': 1.0, 'current_amount': 0.498},
+            'fee': 0.002,
+            'signature': b64encode(rng.randbytes(64)).decode(),
+            'version': 2
+        })
+    block_dict = {
+        'header': {
+            'version': BLOCK_VERSION_MERKLE,
+            'previous_block_hash': previous_hash,
+            'merkle_root': '00' * 32,
+            'timestamp': 0,
+            'bits': 17,
+            'nonce': 0
+        },
+        'data': transactions
+    }
+    return json.loads(json.dumps(block_dict))
+
+"""
+Run the benchmark in a fresh process for the tree at git revision BASELINE and for the current tree
+"""
+def compare_with_baseline():
+    worktree = os.path.join(mkdtemp(), 'baseline')
+    subprocess.run(['git', '-C', REPOSITORY_PATH, 'worktree', 'add', '--detach', worktree, BASELINE], check=True)
+    try:
+        for name, app_path in (('before', os.path.join(worktree, 'app')), ('after', APP_PATH)):
+            print(f"{name}:", flush=True)
+            subprocess.run([executable, os.path.abspath(__file__), '--app', app_path] + ARGUMENTS, check=True)
+    finally:
+        subprocess.run(['git', '-C', REPOSITORY_PATH, 'worktree', 'remove', '--force', worktree], check=True)
+        shutil.rmtree(os.path.dirname(worktree), ignore_errors=True)
+
+def run():
+    rng = Random(1)
+    keys = [make_pem(rng) for _ in range(KEYS)]
+    blocks = []
+    previous_hash = '00' * 32
+    decode_time = 0
+    # peak resident size, block dictionaries are small and freed after every block
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    created = 0
+    while created < TRANSACTIONS:
+        count = min(TRANSACTIONS_PER_BLOCK, TRANSACTIONS - created)
+        block_dict = make_block_dict(rng, keys, previous_hash, count)
+        start = time()
+        block = Block.from_dict_to_block(block_dict, blocks[-1] if blocks else None, f'{len(blocks):064x}')
+        decode_time += time() - start
+        del block_dict
+        blocks.append(block)
+        previous_hash = block.get_hash()
+        created += count
+    # kilobytes on Linux
+    used = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) * 1024
+    print(f"Transactions: {TRANSACTIONS}, keys: {KEYS}, blocks: {len(blocks)}")
+    print(f"Memory of blocks: {used / 2 ** 20:.1f} MiB, per transaction: {used / TRANSACTIONS:.0f} B")
+    print(f"Decoding time: {decode_time:.2f}s")
+
+if __name__ == "__main__":
+    if BASELINE is not None:
+        compare_with_baseline()
+    else:
+        run()